@@ -0,0 +1,828 @@
+#  This file defines the bitboard 'Position' type used as the storage backend
+#  of the 'Game' class. Each square is one bit of a 64-bit integer, with a1 as
+#  bit 0, b1 as bit 1 and so on up to h8 as bit 63. A position keeps one
+#  integer per piece type and colour plus occupancy masks, so most questions
+#  about the board become a handful of integer operations.
+
+import random
+from array import array
+from collections import namedtuple
+from itertools import product
+
+WHITE = 0
+BLACK = 1
+COLORS = ("white", "black")
+
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+PIECES = ("pawn", "knight", "bishop", "rook", "queen", "king")
+
+# Besides the bitboards a position keeps one byte per square holding the
+# code of the piece on it, the piece plus 8 for black pieces, or EMPTY.
+EMPTY = 0xFF
+_EMPTY_BOARD = bytes([EMPTY]) * 64
+_NO_ATTACKS = bytes(8 * 64)
+
+COLUMNS = "abcdefgh"
+
+# Move kinds
+NORMAL = 0
+DOUBLE_PUSH = 1
+EN_PASSANT = 2
+CASTLE = 3
+
+# Castling rights are stored as a 4 bit mask.
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+FULL = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+NOT_FILE_AB = NOT_FILE_A & (FULL ^ (FILE_A << 1))
+NOT_FILE_GH = NOT_FILE_H & (FULL ^ (FILE_A << 6))
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+DARK_SQUARES = 0xAA55AA55AA55AA55  # a1 is a dark square
+
+# Each sliding direction is a shift amount and the mask that stops a ray
+# from wrapping around to the other side of the board.
+ROOK_DIRECTIONS = ((8, FULL), (-8, FULL), (1, NOT_FILE_A), (-1, NOT_FILE_H))
+BISHOP_DIRECTIONS = (
+    (9, NOT_FILE_A),
+    (7, NOT_FILE_H),
+    (-7, NOT_FILE_A),
+    (-9, NOT_FILE_H),
+)
+
+# Castling rights that are lost when a piece moves from or to a square.
+CASTLING_LOST = [0] * 64
+CASTLING_LOST[0] = WHITE_QUEENSIDE
+CASTLING_LOST[4] = WHITE_KINGSIDE | WHITE_QUEENSIDE
+CASTLING_LOST[7] = WHITE_KINGSIDE
+CASTLING_LOST[56] = BLACK_QUEENSIDE
+CASTLING_LOST[60] = BLACK_KINGSIDE | BLACK_QUEENSIDE
+CASTLING_LOST[63] = BLACK_KINGSIDE
+
+# Each castling right with the colour it belongs to and the home squares of
+# the king and rook it needs.
+_CASTLING_HOMES = (
+    (WHITE_KINGSIDE, WHITE, 4, 7),
+    (WHITE_QUEENSIDE, WHITE, 4, 0),
+    (BLACK_KINGSIDE, BLACK, 60, 63),
+    (BLACK_QUEENSIDE, BLACK, 60, 56),
+)
+
+
+# Converts a position in the ('e', 2) or 'e2' format to a square index.
+def square(pos):
+    return (int(pos[1]) - 1) * 8 + ord(pos[0]) - 97
+
+
+# The ('e', 2) format of every square, made once so that converting a square
+# never builds a new tuple.
+_SQUARE_POSITIONS = tuple((COLUMNS[sq & 7], (sq >> 3) + 1) for sq in range(64))
+
+
+# Converts a square index back to the ('e', 2) format used by 'Game'.
+def square_position(sq):
+    return _SQUARE_POSITIONS[sq]
+
+
+# Converts a square index to its name, e.g. 12 -> 'e2'.
+def square_name(sq):
+    return COLUMNS[sq & 7] + str((sq >> 3) + 1)
+
+
+# Yields the index of every set bit of a bitboard, lowest first.
+def scan(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+# Zobrist keys. A position's hash is the XOR of one random 64-bit number per
+# (colour, piece, square) on the board, one for the castling rights, one for
+# the en passant column and one when black is to move. The generator is
+# seeded so that hashes are the same in every process.
+_random = random.Random(0x5EED)
+ZOBRIST_PIECES = [
+    [[_random.getrandbits(64) for sq in range(64)] for piece in range(6)]
+    for color in range(2)
+]
+_castling_keys = [_random.getrandbits(64) for right in range(4)]
+ZOBRIST_CASTLING = [0] * 16
+for _rights in range(16):
+    for _right in range(4):
+        if _rights & (1 << _right):
+            ZOBRIST_CASTLING[_rights] ^= _castling_keys[_right]
+ZOBRIST_EN_PASSANT = [_random.getrandbits(64) for col in range(8)]
+ZOBRIST_BLACK = _random.getrandbits(64)
+
+
+# Parses the castling field of a FEN string into a castling mask.
+def _parse_castling(text):
+    rights = 0
+    for char in text:
+        if char == "-":
+            continue
+        if char not in "KQkq":
+            raise ValueError("invalid castling rights: " + repr(text))
+        rights |= 1 << "KQkq".index(char)
+    return rights
+
+
+def _shift(bb, amount, mask):
+    if amount > 0:
+        return (bb << amount) & mask
+    return (bb >> -amount) & mask
+
+
+# The squares from 'sq' outwards in one direction, nearest first.
+def _ray(sq, amount, mask):
+    squares = []
+    bb = _shift(1 << sq, amount, mask)
+    while bb:
+        squares.append(bb)
+        bb = _shift(bb, amount, mask)
+    return squares
+
+
+# Attack tables, built once when the module is loaded. Knights, kings and
+# pawns attack a fixed set of squares from each square. A slider's attacks
+# only depend on which squares of its lines are occupied, not counting the
+# last square of each line (a piece there cannot block anything), so for
+# every square and every such occupancy the attacks are stored in a
+# dictionary: rook_attacks(sq, occupied) is then
+# ROOK_TABLE[sq][occupied & ROOK_MASKS[sq]].
+def _step_table(steps):
+    table = []
+    for sq in range(64):
+        attacks = 0
+        for amount, mask in steps:
+            attacks |= _shift(1 << sq, amount, mask)
+        table.append(attacks)
+    return table
+
+
+def _slider_table(sq, directions):
+    choices = []
+    mask = 0
+    for amount, wrap in directions:
+        ray = _ray(sq, amount, wrap)
+        relevant = ray[:-1]
+        options = []
+        for bits in range(1 << len(relevant)):
+            occupied = 0
+            for index, bb in enumerate(relevant):
+                if bits >> index & 1:
+                    occupied |= bb
+            attacks = 0
+            for bb in ray:
+                attacks |= bb
+                if bb & occupied:
+                    break
+            options.append((occupied, attacks))
+        choices.append(options)
+        for bb in relevant:
+            mask |= bb
+    table = {0: 0}
+    for combination in product(*choices):
+        occupied = 0
+        attacks = 0
+        for part, part_attacks in combination:
+            occupied |= part
+            attacks |= part_attacks
+        table[occupied] = attacks
+    return mask, table
+
+
+KNIGHT_ATTACKS = _step_table(
+    (
+        (17, NOT_FILE_A),
+        (15, NOT_FILE_H),
+        (10, NOT_FILE_AB),
+        (6, NOT_FILE_GH),
+        (-17, NOT_FILE_H),
+        (-15, NOT_FILE_A),
+        (-10, NOT_FILE_GH),
+        (-6, NOT_FILE_AB),
+    )
+)
+KING_ATTACKS = _step_table(ROOK_DIRECTIONS + BISHOP_DIRECTIONS)
+PAWN_ATTACKS = (
+    _step_table(((9, NOT_FILE_A), (7, NOT_FILE_H))),
+    _step_table(((-7, NOT_FILE_A), (-9, NOT_FILE_H))),
+)
+BISHOP_MASKS, BISHOP_TABLE = zip(
+    *(_slider_table(sq, BISHOP_DIRECTIONS) for sq in range(64))
+)
+ROOK_MASKS, ROOK_TABLE = zip(*(_slider_table(sq, ROOK_DIRECTIONS) for sq in range(64)))
+
+# BETWEEN[a][b] holds the squares strictly between 'a' and 'b' and LINE[a][b]
+# the whole row, column or diagonal through both, when they share one.
+# Both are empty for squares that are not on a common line.
+BETWEEN = [[0] * 64 for sq in range(64)]
+LINE = [[0] * 64 for sq in range(64)]
+_DIRECTIONS = dict(ROOK_DIRECTIONS + BISHOP_DIRECTIONS)
+for _sq in range(64):
+    for _amount, _mask in _DIRECTIONS.items():
+        _line = 1 << _sq
+        for _bb in _ray(_sq, _amount, _mask) + _ray(
+            _sq, -_amount, _DIRECTIONS[-_amount]
+        ):
+            _line |= _bb
+        _between = 0
+        for _bb in _ray(_sq, _amount, _mask):
+            _target = _bb.bit_length() - 1
+            BETWEEN[_sq][_target] = _between
+            LINE[_sq][_target] = _line
+            _between |= _bb
+
+
+def knight_attacks(sq):
+    return KNIGHT_ATTACKS[sq]
+
+
+def king_attacks(sq):
+    return KING_ATTACKS[sq]
+
+
+# Squares attacked by a pawn of 'color' standing on 'sq'.
+def pawn_attacks(color, sq):
+    return PAWN_ATTACKS[color][sq]
+
+
+def bishop_attacks(sq, occupied):
+    return BISHOP_TABLE[sq][occupied & BISHOP_MASKS[sq]]
+
+
+def rook_attacks(sq, occupied):
+    return ROOK_TABLE[sq][occupied & ROOK_MASKS[sq]]
+
+
+def queen_attacks(sq, occupied):
+    return (
+        BISHOP_TABLE[sq][occupied & BISHOP_MASKS[sq]]
+        | ROOK_TABLE[sq][occupied & ROOK_MASKS[sq]]
+    )
+
+
+# 'start' and 'end' are square indices (a1 = 0, h8 = 63) and 'piece',
+# 'captured' and 'promotion' are piece codes from this file. 'captured'
+# and 'promotion' are None when the move is not a capture or promotion.
+class Move(
+    namedtuple("Move", ["start", "end", "piece", "captured", "promotion", "kind"])
+):
+    __slots__ = ()
+
+    @property
+    def is_capture(self):
+        return self.captured is not None
+
+    @property
+    def is_castle(self):
+        return self.kind == CASTLE
+
+    @property
+    def is_en_passant(self):
+        return self.kind == EN_PASSANT
+
+    # The move in long algebraic notation, e.g. 'e2e4' or 'e7e8q'.
+    def uci(self):
+        text = square_name(self.start) + square_name(self.end)
+        if self.promotion is not None:
+            text += "nbrq"[self.promotion - KNIGHT]
+        return text
+
+    def __str__(self):
+        return self.uci()
+
+    def __repr__(self):
+        return "Move(" + self.uci() + ", " + PIECES[self.piece] + ")"
+
+
+class Position:
+    __slots__ = (
+        "pieces",
+        "occupied_co",
+        "occupied",
+        "turn",
+        "castling",
+        "ep_square",
+        "board",
+        "attacks",
+        "_attacked",
+        "_checkers",
+        "_pins",
+        "hash",
+    )
+
+    # An empty board with white to move and no castling rights.
+    def __init__(self):
+        self.pieces = [[0] * 6, [0] * 6]  # pieces[color][piece] bitboards
+        self.occupied_co = [0, 0]  # occupancy of each colour
+        self.occupied = 0
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square = None  # square a pawn can capture onto en passant
+        self.board = bytearray(_EMPTY_BOARD)  # piece code on each square
+        self.attacks = array("Q", _NO_ATTACKS)  # squares each piece attacks
+        self._attacked = [None, None]  # all squares each colour attacks
+        self._checkers = [None, None]  # pieces giving check to each king
+        self._pins = [None, None]  # pinned pieces of each colour
+        self.hash = 0  # Zobrist hash, updated as the position changes
+
+    # The normal starting setup.
+    @classmethod
+    def starting(cls):
+        position = cls()
+        back_rank = (ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK)
+        for col, piece in enumerate(back_rank):
+            position._set(col, WHITE, piece)
+            position._set(8 + col, WHITE, PAWN)
+            position._set(48 + col, BLACK, PAWN)
+            position._set(56 + col, BLACK, piece)
+        position._refresh_attacks(position.occupied)
+        position.castling = (
+            WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        )
+        position.hash = position.zobrist_hash()
+        return position
+
+    # Reads the piece placement, side to move, castling rights and en
+    # passant square of a FEN string. The move counters are ignored here
+    # (see Game.from_fen). Raises ValueError if the FEN is not valid.
+    @classmethod
+    def from_fen(cls, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("incomplete FEN: " + repr(fen))
+        position = cls()
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError("FEN needs 8 rows: " + repr(fen))
+        for i, row in enumerate(rows):
+            col = 0
+            for char in row:
+                if char.isdigit():
+                    col += int(char)
+                    continue
+                if char.lower() not in "pnbrqk" or col > 7:
+                    raise ValueError("invalid FEN row: " + repr(row))
+                color = WHITE if char.isupper() else BLACK
+                piece = "pnbrqk".index(char.lower())
+                position._set((7 - i) * 8 + col, color, piece)
+                col += 1
+            if col != 8:
+                raise ValueError("invalid FEN row: " + repr(row))
+        if fields[1] not in ("w", "b"):
+            raise ValueError("invalid side to move: " + repr(fields[1]))
+        position.turn = WHITE if fields[1] == "w" else BLACK
+        position.castling = _parse_castling(fields[2])
+        if fields[3] != "-":
+            if (
+                len(fields[3]) != 2
+                or fields[3][0] not in COLUMNS
+                or fields[3][1] not in "36"
+            ):
+                raise ValueError("invalid en passant square: " + repr(fields[3]))
+            position.ep_square = square(fields[3])
+        position.validate()
+        position.hash = position.zobrist_hash()
+        return position
+
+    # Checks that the position could come up in a game, after the pieces,
+    # side to move, castling rights and en passant square were set by hand,
+    # and brings the attack maps up to date. Castling rights whose king or
+    # rook is not on its home square are dropped. Raises ValueError if a
+    # side does not have exactly one king, a pawn stands on the first or
+    # last row, the side that just moved is in check, or the en passant
+    # square does not follow a double pawn push. The caller has to work out
+    # the hash afterwards.
+    def validate(self):
+        for color in (WHITE, BLACK):
+            if self.pieces[color][KING].bit_count() != 1:
+                raise ValueError("each side needs exactly one king")
+        if (self.pieces[WHITE][PAWN] | self.pieces[BLACK][PAWN]) & (RANK_1 | RANK_8):
+            raise ValueError("pawns cannot stand on the first or last row")
+        self._refresh_attacks(self.occupied)
+        turn = self.turn
+        if self.checkers(turn ^ 1):
+            raise ValueError("the side that just moved is in check")
+        for right, color, king, rook in _CASTLING_HOMES:
+            if not (
+                self.pieces[color][KING] & (1 << king)
+                and self.pieces[color][ROOK] & (1 << rook)
+            ):
+                self.castling &= ~right
+        ep_square = self.ep_square
+        if ep_square is not None:
+            forward = 8 if turn == WHITE else -8
+            pushed = ep_square - forward
+            if (
+                ep_square >> 3 != (5 if turn == WHITE else 2)
+                or not self.pieces[turn ^ 1][PAWN] & (1 << pushed)
+                or self.occupied & (1 << ep_square | 1 << (ep_square + forward))
+            ):
+                raise ValueError("invalid en passant square: " + square_name(ep_square))
+
+    # The piece placement, side to move, castling and en passant fields of
+    # a FEN string (without the move counters).
+    def to_fen(self):
+        rows = []
+        for row in range(7, -1, -1):
+            text = ""
+            empty = 0
+            for col in range(8):
+                found = self.piece_at(row * 8 + col)
+                if found is None:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                letter = "pnbrqk"[found[1]]
+                text += letter.upper() if found[0] == WHITE else letter
+            if empty:
+                text += str(empty)
+            rows.append(text)
+        castling = "".join(
+            char for i, char in enumerate("KQkq") if self.castling & (1 << i)
+        )
+        return " ".join(
+            [
+                "/".join(rows),
+                "w" if self.turn == WHITE else "b",
+                castling or "-",
+                "-" if self.ep_square is None else square_name(self.ep_square),
+            ]
+        )
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.pieces = [self.pieces[WHITE][:], self.pieces[BLACK][:]]
+        position.occupied_co = self.occupied_co[:]
+        position.occupied = self.occupied
+        position.turn = self.turn
+        position.castling = self.castling
+        position.ep_square = self.ep_square
+        position.board = self.board[:]
+        position.attacks = self.attacks[:]
+        position._attacked = self._attacked[:]
+        position._checkers = self._checkers[:]
+        position._pins = self._pins[:]
+        position.hash = self.hash
+        return position
+
+    # Returns (color, piece) for the piece on 'sq', or None if it is empty.
+    def piece_at(self, sq):
+        code = self.board[sq]
+        if code == EMPTY:
+            return None
+        return code >> 3, code & 7
+
+    def put_piece(self, sq, color, piece):
+        self._set(sq, color, piece)
+        self._refresh_attacks(1 << sq)
+
+    # Takes a piece that is known to be on 'sq' off the board.
+    def discard_piece(self, sq, color, piece):
+        self._clear(sq, color, piece)
+        self._refresh_attacks(1 << sq)
+
+    # _set and _clear only change the bitboards and the board. Callers have
+    # to refresh the attack maps for the squares they touched afterwards.
+    def _set(self, sq, color, piece):
+        bb = 1 << sq
+        self.pieces[color][piece] |= bb
+        self.occupied_co[color] |= bb
+        self.occupied |= bb
+        self.board[sq] = piece | color << 3
+        self.hash ^= ZOBRIST_PIECES[color][piece][sq]
+
+    def _clear(self, sq, color, piece):
+        bb = ~(1 << sq)
+        self.pieces[color][piece] &= bb
+        self.occupied_co[color] &= bb
+        self.occupied &= bb
+        self.board[sq] = EMPTY
+        self.hash ^= ZOBRIST_PIECES[color][piece][sq]
+
+    # The en passant part of the hash. The column only counts when a pawn of
+    # the side to move could actually capture, so that positions which only
+    # differ by an unusable en passant square hash the same.
+    def _en_passant_key(self):
+        ep_square = self.ep_square
+        if ep_square is None:
+            return 0
+        turn = self.turn
+        if not pawn_attacks(turn ^ 1, ep_square) & self.pieces[turn][PAWN]:
+            return 0
+        return ZOBRIST_EN_PASSANT[ep_square & 7]
+
+    # Works out the Zobrist hash from scratch. Only needed after the side to
+    # move, castling rights or en passant square are set by hand; moves keep
+    # the 'hash' attribute up to date themselves.
+    def zobrist_hash(self):
+        key = 0
+        for color in (WHITE, BLACK):
+            for piece in range(6):
+                for sq in scan(self.pieces[color][piece]):
+                    key ^= ZOBRIST_PIECES[color][piece][sq]
+        key ^= ZOBRIST_CASTLING[self.castling] ^ self._en_passant_key()
+        if self.turn == BLACK:
+            key ^= ZOBRIST_BLACK
+        return key
+
+    # The squares attacked by whatever stands on 'sq'.
+    def _attacks_of(self, sq):
+        found = self.piece_at(sq)
+        if found is None:
+            return 0
+        color, piece = found
+        if piece == PAWN:
+            return pawn_attacks(color, sq)
+        if piece == KNIGHT:
+            return knight_attacks(sq)
+        if piece == BISHOP:
+            return bishop_attacks(sq, self.occupied)
+        if piece == ROOK:
+            return rook_attacks(sq, self.occupied)
+        if piece == QUEEN:
+            return queen_attacks(sq, self.occupied)
+        return king_attacks(sq)
+
+    # Brings the attack maps up to date after the squares in 'changed' were
+    # filled or emptied. Besides the pieces on those squares, only sliders
+    # whose lines ran into one of them can have gained or lost squares.
+    def _refresh_attacks(self, changed):
+        attacks = self.attacks
+        for sq in scan(changed):
+            attacks[sq] = self._attacks_of(sq)
+        sliders = 0
+        for pieces in self.pieces:
+            sliders |= pieces[BISHOP] | pieces[ROOK] | pieces[QUEEN]
+        for sq in scan(sliders & ~changed):
+            if attacks[sq] & changed:
+                attacks[sq] = self._attacks_of(sq)
+        self._attacked = [None, None]
+        self._checkers = [None, None]
+        self._pins = [None, None]
+
+    # Clears 'sq' and returns the (color, piece) that was standing on it.
+    def remove_piece(self, sq):
+        found = self.piece_at(sq)
+        if found is not None:
+            self.discard_piece(sq, *found)
+        return found
+
+    def king(self, color):
+        return self.pieces[color][KING].bit_length() - 1
+
+    # Bitboard of the pieces of 'color' that attack 'sq'. Sliding pieces are
+    # blocked by 'occupied', which defaults to the current occupancy.
+    def attackers(self, color, sq, occupied=None):
+        if occupied is None:
+            occupied = self.occupied
+        pieces = self.pieces[color]
+        queens = pieces[QUEEN]
+        return (
+            (pawn_attacks(color ^ 1, sq) & pieces[PAWN])
+            | (knight_attacks(sq) & pieces[KNIGHT])
+            | (king_attacks(sq) & pieces[KING])
+            | (bishop_attacks(sq, occupied) & (pieces[BISHOP] | queens))
+            | (rook_attacks(sq, occupied) & (pieces[ROOK] | queens))
+        )
+
+    # Every square attacked (or defended) by a piece of 'color', built from
+    # the per-square attack maps and kept until the board changes.
+    def attacked_by(self, color):
+        attacked = self._attacked[color]
+        if attacked is None:
+            attacked = 0
+            attacks = self.attacks
+            for sq in scan(self.occupied_co[color]):
+                attacked |= attacks[sq]
+            self._attacked[color] = attacked
+        return attacked
+
+    def is_attacked(self, color, sq):
+        return bool(self.attacked_by(color) & (1 << sq))
+
+    # Bitboard of the enemy pieces giving check to the king of 'color'. Like
+    # pins, it is worked out once and kept until the board changes.
+    def checkers(self, color):
+        found = self._checkers[color]
+        if found is None:
+            found = 0
+            king = 1 << self.king(color)
+            if self.attacked_by(color ^ 1) & king:
+                attacks = self.attacks
+                for sq in scan(self.occupied_co[color ^ 1]):
+                    if attacks[sq] & king:
+                        found |= 1 << sq
+            self._checkers[color] = found
+        return found
+
+    # Finds the pieces of 'color' pinned to their king. Returns a dictionary
+    # from each pinned square to the squares that piece may still move to
+    # (the line between the king and the pinner, and the pinner itself).
+    def pins(self, color):
+        found = self._pins[color]
+        if found is None:
+            king = self.king(color)
+            enemy = self.pieces[color ^ 1]
+            # Enemy sliders that would attack the king on an empty board.
+            snipers = (rook_attacks(king, 0) & (enemy[ROOK] | enemy[QUEEN])) | (
+                bishop_attacks(king, 0) & (enemy[BISHOP] | enemy[QUEEN])
+            )
+            found = {}
+            for pinner in scan(snipers):
+                between = BETWEEN[king][pinner]
+                blockers = between & self.occupied
+                if blockers & self.occupied_co[color] and not blockers & (
+                    blockers - 1
+                ):
+                    found[blockers.bit_length() - 1] = between | (1 << pinner)
+            self._pins[color] = found
+        return found
+
+    # True if neither side has enough material left to checkmate: only
+    # kings, a single knight, or bishops that all stand on squares of the
+    # same colour.
+    def insufficient_material(self):
+        for pieces in self.pieces:
+            if pieces[PAWN] | pieces[ROOK] | pieces[QUEEN]:
+                return False
+        knights = self.pieces[WHITE][KNIGHT] | self.pieces[BLACK][KNIGHT]
+        bishops = self.pieces[WHITE][BISHOP] | self.pieces[BLACK][BISHOP]
+        if not bishops:
+            return knights.bit_count() <= 1
+        if knights:
+            return False
+        return not bishops & DARK_SQUARES or not bishops & ~DARK_SQUARES
+
+    # True if 'move', which the piece on its start square could make if
+    # check did not matter, does not leave its own king in check. Moves of
+    # other pieces are settled from the checkers and pins alone; only king
+    # moves and en passant captures look at the board after the move.
+    def is_legal(self, move):
+        start = move.start
+        end = move.end
+        color = WHITE if self.occupied_co[WHITE] & (1 << start) else BLACK
+        them = color ^ 1
+        king = self.king(color)
+        checkers = self.checkers(color)
+        if move.piece == KING:
+            if move.kind == CASTLE:
+                crossed = (1 << ((start + end) >> 1)) | (1 << end)
+                return not checkers and not self.attacked_by(them) & crossed
+            return not self.attackers(them, end, self.occupied ^ (1 << king))
+        if move.kind == EN_PASSANT:
+            captured = end - 8 if color == WHITE else end + 8
+            occupied = self.occupied ^ (1 << start) ^ (1 << captured) | (1 << end)
+            return not self.attackers(them, king, occupied) & ~(1 << captured)
+        if checkers:
+            if checkers & (checkers - 1):
+                return False  # Only the king can get out of a double check.
+            checker = checkers.bit_length() - 1
+            if not (checkers | BETWEEN[king][checker]) & (1 << end):
+                return False
+        pinned = self.pins(color).get(start)
+        return pinned is None or bool(pinned & (1 << end))
+
+    # Bitboard of the squares the piece on 'sq' can move to, ignoring check
+    # and castling. Squares held by the piece's own side are excluded.
+    def targets(self, sq):
+        found = self.piece_at(sq)
+        if found is None:
+            return 0
+        color, piece = found
+        own = self.occupied_co[color]
+        if piece == PAWN:
+            return self.pawn_targets(color, sq)
+        if piece == KNIGHT:
+            return knight_attacks(sq) & ~own
+        if piece == BISHOP:
+            return bishop_attacks(sq, self.occupied) & ~own
+        if piece == ROOK:
+            return rook_attacks(sq, self.occupied) & ~own
+        if piece == QUEEN:
+            return queen_attacks(sq, self.occupied) & ~own
+        return king_attacks(sq) & ~own
+
+    def pawn_targets(self, color, sq):
+        empty = ~self.occupied
+        captures = self.occupied_co[color ^ 1]
+        if self.ep_square is not None and (self.ep_square >> 3) == (
+            5 if color == WHITE else 2
+        ):
+            captures |= 1 << self.ep_square
+        if color == WHITE:
+            push = (1 << (sq + 8)) & empty
+            if push and 8 <= sq < 16:
+                push |= (push << 8) & empty
+        else:
+            push = (1 << sq >> 8) & empty
+            if push and 48 <= sq < 56:
+                push |= (push >> 8) & empty
+        return push | (pawn_attacks(color, sq) & captures)
+
+    # Builds the 'Move' for moving the piece on 'start' to 'end'. No legality
+    # checks are made. 'promotion' is only used when a pawn reaches the last row.
+    def build_move(self, start, end, promotion=QUEEN):
+        _, piece = self.piece_at(start)
+        found = self.piece_at(end)
+        captured = found[1] if found else None
+        kind = NORMAL
+        if piece == PAWN:
+            if abs(end - start) == 16:
+                kind = DOUBLE_PUSH
+            elif end == self.ep_square and found is None and (end - start) & 7:
+                kind = EN_PASSANT
+                captured = PAWN
+            if not 8 <= end < 56:
+                return Move(start, end, piece, captured, promotion, kind)
+        elif piece == KING and abs(end - start) == 2:
+            kind = CASTLE
+        return Move(start, end, piece, captured, None, kind)
+
+    # Plays a move that is already known to be legal, including the rook
+    # part of castling, en passant captures and promotion. Save the castling
+    # rights, en passant square and hash first to be able to undo it.
+    def play(self, move):
+        start = move.start
+        end = move.end
+        color = WHITE if self.occupied_co[WHITE] & (1 << start) else BLACK
+        self.hash ^= self._en_passant_key() ^ ZOBRIST_CASTLING[self.castling]
+        changed = (1 << start) | (1 << end)
+        if move.kind == EN_PASSANT:
+            captured = end - 8 if color == WHITE else end + 8
+            self._clear(captured, color ^ 1, PAWN)
+            changed |= 1 << captured
+        elif move.captured is not None:
+            self._clear(end, color ^ 1, move.captured)
+        self._clear(start, color, move.piece)
+        if move.promotion is not None:
+            self._set(end, color, move.promotion)
+        else:
+            self._set(end, color, move.piece)
+        if move.kind == CASTLE:
+            if end > start:
+                rook_start, rook_end = start + 3, start + 1
+            else:
+                rook_start, rook_end = start - 4, start - 1
+            self._clear(rook_start, color, ROOK)
+            self._set(rook_end, color, ROOK)
+            changed |= (1 << rook_start) | (1 << rook_end)
+        self._refresh_attacks(changed)
+        self.castling &= ~(CASTLING_LOST[start] | CASTLING_LOST[end])
+        if move.kind == DOUBLE_PUSH:
+            self.ep_square = (start + end) // 2
+        else:
+            self.ep_square = None
+        self.turn = color ^ 1
+        self.hash ^= (
+            self._en_passant_key() ^ ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_BLACK
+        )
+
+    # Takes back 'move', which must be the last move played. 'castling',
+    # 'ep_square' and 'key' are the values from before it was played.
+    def undo(self, move, castling, ep_square, key):
+        start = move.start
+        end = move.end
+        color = self.turn ^ 1
+        changed = (1 << start) | (1 << end)
+        if move.promotion is not None:
+            self._clear(end, color, move.promotion)
+        else:
+            self._clear(end, color, move.piece)
+        self._set(start, color, move.piece)
+        if move.kind == EN_PASSANT:
+            captured = end - 8 if color == WHITE else end + 8
+            self._set(captured, color ^ 1, PAWN)
+            changed |= 1 << captured
+        elif move.captured is not None:
+            self._set(end, color ^ 1, move.captured)
+        if move.kind == CASTLE:
+            if end > start:
+                rook_start, rook_end = start + 3, start + 1
+            else:
+                rook_start, rook_end = start - 4, start - 1
+            self._clear(rook_end, color, ROOK)
+            self._set(rook_start, color, ROOK)
+            changed |= (1 << rook_start) | (1 << rook_end)
+        self._refresh_attacks(changed)
+        self.castling = castling
+        self.ep_square = ep_square
+        self.turn = color
+        self.hash = key
@@ -0,0 +1,117 @@
+import struct
+
+from bitboard import KING, Position, scan
+from game import Game
+
+#  This file packs a position into a fixed-width 32 byte record and back,
+#  for sending positions between processes and storing large numbers of
+#  them. A record holds, in little-endian order:
+#
+#    8 bytes   occupancy bitboard (bit 0 is a1, bit 63 is h8)
+#    16 bytes  one 4-bit code per occupied square, lowest square first:
+#              the piece code, plus 8 for black pieces
+#    1 byte    side to move in bit 0 and the castling rights in bits 1-4
+#    1 byte    en passant square, or 64 when there is none
+#    1 byte    halfmove clock (capped at 255)
+#    2 bytes   fullmove number
+#    3 bytes   padding (zero)
+#
+#  Records are read straight out of any bytes, bytearray, memoryview or
+#  mmap with struct.unpack_from, so a buffer of many records never has to
+#  be sliced or copied.
+
+RECORD = struct.Struct("<QQQBBBH3x")
+RECORD_SIZE = RECORD.size  # 32
+NO_EN_PASSANT = 64
+
+# The layout of the training sample shards written by export.py and loaded
+# by features.py: each sample is a record followed by SAMPLE_TAIL, and each
+# shard starts with SHARD_HEADER.
+SAMPLE_TAIL = struct.Struct("<HbB4x512s")  # move, result, legal moves, mask
+SAMPLE_SIZE = RECORD_SIZE + SAMPLE_TAIL.size  # 552
+SHARD_HEADER = struct.Struct("<8sQ")  # magic, number of samples
+SHARD_MAGIC = b"CHESSTRN"
+
+
+# Packs a Position plus its move counters into a 32 byte record.
+def encode_position(position, halfmove=0, fullmove=1):
+    return _pack(RECORD.pack, (), position, halfmove, fullmove)
+
+
+# Packs the position and move counters of a Game into a 32 byte record.
+def encode(game):
+    return encode_position(
+        game.position, game.turn_count - game.fifty - 1, (game.turn_count + 1) // 2
+    )
+
+
+# Writes the record of 'game' into 'buffer' (a bytearray, writable
+# memoryview or mmap) at 'offset' without making a bytes object.
+def encode_into(buffer, offset, game):
+    _pack(
+        RECORD.pack_into,
+        (buffer, offset),
+        game.position,
+        game.turn_count - game.fifty - 1,
+        (game.turn_count + 1) // 2,
+    )
+
+
+def _pack(pack, target, position, halfmove, fullmove):
+    occupied = position.occupied
+    if occupied.bit_count() > 32:
+        raise ValueError("a record holds at most 32 pieces")
+    if not 1 <= fullmove <= 0xFFFF:
+        raise ValueError("fullmove number out of range: " + str(fullmove))
+    board = position.board
+    nibbles = 0
+    for index, sq in enumerate(scan(occupied)):
+        nibbles |= board[sq] << 4 * index
+    ep_square = position.ep_square
+    return pack(
+        *target,
+        occupied,
+        nibbles & 0xFFFFFFFFFFFFFFFF,
+        nibbles >> 64,
+        position.turn | position.castling << 1,
+        NO_EN_PASSANT if ep_square is None else ep_square,
+        min(max(halfmove, 0), 0xFF),
+        fullmove,
+    )
+
+
+# Reads the record at 'offset' in 'buffer' and returns (position, halfmove,
+# fullmove). Raises ValueError if the record does not hold a valid position.
+def decode_position(buffer, offset=0):
+    occupied, low, high, flags, ep_square, halfmove, fullmove = RECORD.unpack_from(
+        buffer, offset
+    )
+    nibbles = low | high << 64
+    position = Position()
+    for sq in scan(occupied):
+        code = nibbles & 15
+        nibbles >>= 4
+        if code & 7 > KING:
+            raise ValueError("invalid piece code in record: " + str(code))
+        position._set(sq, code >> 3, code & 7)
+    if ep_square > NO_EN_PASSANT or flags >> 5 or not fullmove:
+        raise ValueError("invalid record")
+    position.turn = flags & 1
+    position.castling = flags >> 1
+    position.ep_square = None if ep_square == NO_EN_PASSANT else ep_square
+    position.validate()
+    position.hash = position.zobrist_hash()
+    return position, halfmove, fullmove
+
+
+# Reads the record at 'offset' in 'buffer' as a new Game.
+def decode(buffer, offset=0):
+    return Game.from_position(*decode_position(buffer, offset))
+
+
+# Yields a Game for every record in 'buffer', which must hold whole records.
+def decode_all(buffer):
+    if len(buffer) % RECORD_SIZE:
+        raise ValueError("buffer does not hold whole records")
+    for offset in range(0, len(buffer), RECORD_SIZE):
+        yield decode(buffer, offset)
@@ -0,0 +1,233 @@
+import argparse
+import mmap
+import os
+import time
+from collections import namedtuple
+
+from encoding import (
+    RECORD_SIZE,
+    SAMPLE_SIZE,
+    SAMPLE_TAIL,
+    SHARD_HEADER,
+    SHARD_MAGIC,
+    decode,
+    encode_into,
+)
+from game import Game
+from pgn import game_result, parse_san, read_games
+from replay import resolve
+from transposition import move_code
+
+#  This file turns recorded games into training samples. Every game is
+#  replayed through the rules without any prompts, and each position before
+#  a move becomes one fixed-size sample, written straight to disk in shards
+#  of a set number of samples. Only the game being replayed is ever held in
+#  memory. A sample holds, in little-endian order:
+#
+#    32 bytes   the position, side to move and move counters as an
+#               encoding.py record
+#    2 bytes    the move played, packed by move_code (see transposition.py)
+#    1 byte     the result of the game for white: 1, 0 or -1, or -128 when
+#               it is not known
+#    1 byte     the number of legal moves
+#    4 bytes    padding (zero)
+#    512 bytes  the legal move mask: bit start * 64 + end is set for every
+#               legal move from 'start' to 'end' (promotions share a bit)
+#
+#  Each shard starts with a 16 byte header, the magic bytes b"CHESSTRN" and
+#  the number of samples, so a shard can be read with numpy.fromfile or
+#  memory-mapped and sliced without parsing. The layout constants live in
+#  encoding.py, so that features.py can read shards without this file.
+
+DEFAULT_SHARD_SAMPLES = 1 << 16
+
+NO_RESULT = -128
+RESULT_CODES = {"1-0": 1, "1/2-1/2": 0, "0-1": -1}
+
+# 'game' is the position of the sample as a new Game, 'move' the move
+# played from it as packed by move_code, 'result' the result for white (or
+# NO_RESULT) and 'legal' the legal move mask as an integer.
+Sample = namedtuple("Sample", ["game", "move", "result", "legal"])
+
+
+# Replays 'moves' from 'game' (a new Game by default) and returns the
+# samples of every position before a move, as one bytearray. The moves may
+# be in any of the formats of replay.py, or in SAN when 'san' is True.
+# 'result' is the PGN result of the game; when it is "*" the result is taken
+# from the final position if that ends the game. Raises ValueError at the
+# first move that is not legal.
+def game_samples(moves, result="*", game=None, san=False):
+    if game is None:
+        game = Game()
+    samples = bytearray()
+    for index, text in enumerate(moves):
+        legal = game.legal_moves()
+        move = parse_san(game, text, legal) if san else resolve(game, text)
+        if move is None:
+            raise ValueError(
+                "move " + str(index + 1) + " (" + str(text) + ") is not legal"
+            )
+        mask = 0
+        for other in legal:
+            mask |= 1 << (other.start << 6 | other.end)
+        offset = len(samples)
+        samples.extend(bytes(SAMPLE_SIZE))
+        encode_into(samples, offset, game)
+        SAMPLE_TAIL.pack_into(
+            samples,
+            offset + RECORD_SIZE,
+            move_code(move),
+            0,
+            len(legal),
+            mask.to_bytes(512, "little"),
+        )
+        game.make_move(move)
+    if result == "*":
+        result = game_result(game)
+    samples[RECORD_SIZE + 2 :: SAMPLE_SIZE] = bytes(
+        [RESULT_CODES.get(result, NO_RESULT) & 0xFF]
+    ) * (len(samples) // SAMPLE_SIZE)
+    return samples
+
+
+class ShardWriter:
+    # Writes samples to files named 'prefix' followed by "-00000.bin",
+    # "-00001.bin" and so on, starting a new one every 'samples_per_shard'
+    # samples.
+    def __init__(self, prefix, samples_per_shard=DEFAULT_SHARD_SAMPLES):
+        if samples_per_shard < 1:
+            raise ValueError("a shard needs room for at least one sample")
+        self.prefix = prefix
+        self.samples_per_shard = samples_per_shard
+        self.shards = []  # paths of the shards written so far
+        self.count = 0  # samples written in all shards
+        self._file = None
+        self._in_shard = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Appends whole samples, e.g. from game_samples, starting new shards as
+    # they fill up.
+    def write(self, samples):
+        if len(samples) % SAMPLE_SIZE:
+            raise ValueError("samples must be a whole number of samples")
+        view = memoryview(samples)
+        while view:
+            if self._file is None or self._in_shard == self.samples_per_shard:
+                self._next_shard()
+            room = (self.samples_per_shard - self._in_shard) * SAMPLE_SIZE
+            chunk = view[:room]
+            self._file.write(chunk)
+            self._in_shard += len(chunk) // SAMPLE_SIZE
+            self.count += len(chunk) // SAMPLE_SIZE
+            view = view[room:]
+
+    def close(self):
+        if self._file is not None:
+            self._finish_shard()
+
+    def _next_shard(self):
+        if self._file is not None:
+            self._finish_shard()
+        path = self.prefix + "-" + str(len(self.shards)).zfill(5) + ".bin"
+        self._file = open(path, "wb")
+        self._file.write(SHARD_HEADER.pack(SHARD_MAGIC, 0))
+        self._in_shard = 0
+        self.shards.append(path)
+
+    def _finish_shard(self):
+        self._file.seek(0)
+        self._file.write(SHARD_HEADER.pack(SHARD_MAGIC, self._in_shard))
+        self._file.close()
+        self._file = None
+
+
+# Replays every game of an open PGN file and writes its samples with
+# 'writer'. Games with a move that is not legal are left out. Returns the
+# number of games written and the number left out.
+def export_pgn(stream, writer):
+    written = skipped = 0
+    for pgn_game in read_games(stream):
+        headers = pgn_game.headers
+        try:
+            start = Game.from_fen(headers["FEN"]) if "FEN" in headers else None
+            samples = game_samples(pgn_game.moves, pgn_game.result, start, True)
+        except ValueError:
+            skipped += 1
+            continue
+        writer.write(samples)
+        written += 1
+    return written, skipped
+
+
+# The same for a file with one game per line, as space separated moves in
+# long algebraic notation (see replay.py). The results are taken from the
+# final positions.
+def export_lines(stream, writer):
+    written = skipped = 0
+    for line in stream:
+        try:
+            samples = game_samples(line.split())
+        except ValueError:
+            skipped += 1
+            continue
+        writer.write(samples)
+        written += 1
+    return written, skipped
+
+
+# Yields a Sample for every sample in the shard at 'path'.
+def read_samples(path):
+    with open(path, "rb") as shard_file:
+        with mmap.mmap(shard_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, count = SHARD_HEADER.unpack_from(data, 0)
+            if magic != SHARD_MAGIC:
+                raise ValueError("not a sample shard: " + repr(path))
+            for index in range(count):
+                offset = SHARD_HEADER.size + index * SAMPLE_SIZE
+                move, result, _, mask = SAMPLE_TAIL.unpack_from(
+                    data, offset + RECORD_SIZE
+                )
+                yield Sample(
+                    decode(data, offset), move, result, int.from_bytes(mask, "little")
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export games as training samples.")
+    parser.add_argument(
+        "games", help="a PGN file, or a file with one game of UCI moves per line"
+    )
+    parser.add_argument("prefix", help="start of the names of the shard files")
+    parser.add_argument(
+        "--shard-samples",
+        type=int,
+        default=DEFAULT_SHARD_SAMPLES,
+        help="samples per shard file",
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with ShardWriter(args.prefix, args.shard_samples) as writer:
+        with open(args.games) as games_file:
+            if os.path.splitext(args.games)[1].lower() == ".pgn":
+                written, skipped = export_pgn(games_file, writer)
+            else:
+                written, skipped = export_lines(games_file, writer)
+    elapsed = time.perf_counter() - started
+    print(
+        str(writer.count)
+        + " samples from "
+        + str(written)
+        + " games ("
+        + str(skipped)
+        + " left out) in "
+        + str(len(writer.shards))
+        + " shards, "
+        + str(int(writer.count / elapsed * 3600) if elapsed else 0)
+        + " samples per hour."
+    )
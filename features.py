@@ -0,0 +1,266 @@
+from collections import namedtuple
+
+import numpy as np
+
+from bitboard import (
+    BISHOP,
+    BLACK,
+    EMPTY,
+    KING,
+    KING_ATTACKS,
+    KNIGHT,
+    KNIGHT_ATTACKS,
+    PAWN,
+    PAWN_ATTACKS,
+    QUEEN,
+    ROOK,
+    WHITE,
+    scan,
+)
+from encoding import RECORD_SIZE, SAMPLE_SIZE, SHARD_HEADER, SHARD_MAGIC
+from search import PIECE_VALUES
+
+#  This file works out features of many positions at once with NumPy, for
+#  building training sets. Positions are passed around as an (N, 64) int8
+#  array of boards, one row per position with a1 first and h8 last, holding
+#  the same code per square as 'Position.board': the piece, plus 8 for black
+#  pieces, or -1 for an empty square. Every feature is computed for all the
+#  boards together; nothing loops over positions in Python.
+#
+#  NumPy is only needed by this file, not by the rest of the package.
+
+EMPTY_CODE = np.int8(EMPTY - 256)  # EMPTY as a signed byte
+
+# 'material' is white's material minus black's in centipawns. The others
+# have one column per colour (WHITE, BLACK): 'counts' the number of each
+# piece, shape (N, 2, 6); 'attacks' how many of the colour's pieces attack
+# each square, shape (N, 2, 64); 'mobility' the squares the colour's
+# knights, bishops, rooks, queens and king attack that are not taken by its
+# own pieces, counted once per piece; 'attacked' how many of the colour's
+# pieces other than the king the other side attacks; 'defended' how many
+# of them the colour itself protects; 'hanging' how many are attacked but
+# not protected; and 'in_check' whether the colour's king is attacked.
+Features = namedtuple(
+    "Features",
+    [
+        "material",
+        "counts",
+        "attacks",
+        "mobility",
+        "attacked",
+        "defended",
+        "hanging",
+        "in_check",
+    ],
+)
+
+# The columns of feature_matrix, in order.
+FEATURE_NAMES = (
+    ("turn", "material")
+    + tuple(
+        color + "_" + name
+        for name in (
+            "pawns",
+            "knights",
+            "bishops",
+            "rooks",
+            "queens",
+            "mobility",
+            "attacked",
+            "defended",
+            "hanging",
+            "in_check",
+        )
+        for color in ("white", "black")
+    )
+)
+
+
+# For every square, the squares a table of attack bitboards reaches from it,
+# padded with 64 (the index of an extra empty square added to each board).
+def _targets(table):
+    targets = np.full((64, 8), 64, dtype=np.intp)
+    for sq in range(64):
+        for index, target in enumerate(scan(table[sq])):
+            targets[sq, index] = target
+    return targets
+
+
+# The squares from each square outwards in one direction, nearest first and
+# padded with 64.
+def _rays(col_step, row_step):
+    rays = np.full((64, 7), 64, dtype=np.intp)
+    for sq in range(64):
+        col, row = sq % 8 + col_step, sq // 8 + row_step
+        index = 0
+        while 0 <= col < 8 and 0 <= row < 8:
+            rays[sq, index] = row * 8 + col
+            col, row = col + col_step, row + row_step
+            index += 1
+    return rays
+
+
+# A knight, king or pawn on a square attacks a target exactly when the
+# same piece on the target (a pawn of the other colour) would attack the
+# square, so the squares attacking each target can be read off the same
+# tables.
+_KNIGHT_TARGETS = _targets(KNIGHT_ATTACKS)
+_KING_TARGETS = _targets(KING_ATTACKS)
+_PAWN_ATTACKERS = (_targets(PAWN_ATTACKS[BLACK]), _targets(PAWN_ATTACKS[WHITE]))
+
+_ROOK_RAYS = [_rays(*step) for step in ((0, 1), (0, -1), (1, 0), (-1, 0))]
+_BISHOP_RAYS = [_rays(*step) for step in ((1, 1), (-1, 1), (1, -1), (-1, -1))]
+
+# What a slider looking along a line finds on a square, by the piece code
+# of the square (15 for an empty one): nothing, a rook or queen (bishop or
+# queen) of either colour, or some other piece that blocks the line.
+_NOTHING = 0
+_WHITE_SLIDER = 1
+_BLACK_SLIDER = 2
+_BLOCKER = 3
+_ROOK_KINDS = np.full(16, _BLOCKER, dtype=np.uint8)
+_BISHOP_KINDS = np.full(16, _BLOCKER, dtype=np.uint8)
+for _kinds, _slider in ((_ROOK_KINDS, ROOK), (_BISHOP_KINDS, BISHOP)):
+    _kinds[15] = _NOTHING
+    _kinds[[_slider, QUEEN]] = _WHITE_SLIDER
+    _kinds[[8 + _slider, 8 + QUEEN]] = _BLACK_SLIDER
+
+# The material value of each piece code, negative for black pieces.
+_CODE_VALUES = np.zeros(16, dtype=np.int32)
+_CODE_VALUES[:6] = PIECE_VALUES
+_CODE_VALUES[8:14] = [-value for value in PIECE_VALUES]
+
+
+# Stacks the boards of some Games or Positions into an (N, 64) int8 array.
+# Returns the boards and an (N,) int8 array of the side to move in each.
+def boards_from_games(games):
+    positions = [getattr(game, "position", game) for game in games]
+    boards = np.frombuffer(
+        bytearray().join(position.board for position in positions), dtype=np.int8
+    ).reshape(-1, 64)
+    turns = np.array([position.turn for position in positions], dtype=np.int8)
+    return boards, turns
+
+
+# Unpacks a buffer of 32 byte records (see encoding.py) into an (N, 64) int8
+# array of boards and an (N,) int8 array of the side to move, without
+# decoding the records one by one.
+def boards_from_records(buffer):
+    if len(buffer) % RECORD_SIZE:
+        raise ValueError("buffer does not hold whole records")
+    records = np.frombuffer(buffer, dtype=np.uint64).reshape(-1, RECORD_SIZE // 8)
+    bits = np.arange(64, dtype=np.uint64)
+    occupied = (records[:, :1] >> bits & np.uint64(1)).astype(bool)
+    # The codes of the occupied squares, lowest square first.
+    shifts = np.arange(0, 64, 4, dtype=np.uint64)
+    nibbles = np.concatenate(
+        [records[:, 1:2] >> shifts, records[:, 2:3] >> shifts], axis=1
+    )
+    codes = (nibbles & np.uint64(15)).astype(np.int8)
+    rank = np.cumsum(occupied, axis=1) - 1
+    boards = np.where(
+        occupied, np.take_along_axis(codes, np.maximum(rank, 0), axis=1), EMPTY_CODE
+    ).astype(np.int8)
+    turns = (records[:, 3] & np.uint64(1)).astype(np.int8)
+    return boards, turns
+
+
+# How many pieces of each colour attack each square, split into pawns and
+# the other pieces. Each is an (N, 2, 64) array.
+def _attack_counts(boards):
+    count = len(boards)
+    # Square by square, so that each lookup below copies whole rows.
+    padded = np.concatenate([boards.T, np.full((1, count), EMPTY_CODE)])
+    pawns = np.zeros((2, 64, count), dtype=np.uint8)
+    pieces = np.zeros((2, 64, count), dtype=np.uint8)
+    for color in (WHITE, BLACK):
+        base = color << 3
+        for piece, targets, counts in (
+            (PAWN, _PAWN_ATTACKERS[color], pawns),
+            (KNIGHT, _KNIGHT_TARGETS, pieces),
+            (KING, _KING_TARGETS, pieces),
+        ):
+            found = (padded == base + piece).view(np.uint8)
+            counts[color] += found[targets].sum(1, dtype=np.uint8)
+
+    # A slider attacks a square when it is the first piece met going out
+    # from that square along one of the slider's lines. The rays from all
+    # squares are walked together, one step at a time.
+    index = padded & 15
+    for rays, kinds in ((_ROOK_RAYS, _ROOK_KINDS), (_BISHOP_RAYS, _BISHOP_KINDS)):
+        kind = kinds[index]
+        for ray in rays:
+            open_rays = np.ones((64, count), dtype=bool)
+            for step in range(7):
+                met = kind[ray[:, step]] * open_rays
+                pieces[WHITE] += met == _WHITE_SLIDER
+                pieces[BLACK] += met == _BLACK_SLIDER
+                open_rays &= met == _NOTHING
+                if not open_rays.any():
+                    break
+    return pawns.transpose(2, 0, 1), pieces.transpose(2, 0, 1)
+
+
+# Works out the Features of an (N, 64) int8 array of boards.
+def featurize(boards):
+    boards = np.asarray(boards, dtype=np.int8)
+    if boards.ndim != 2 or boards.shape[1] != 64:
+        raise ValueError("boards must have shape (N, 64)")
+    occupied = boards != EMPTY_CODE
+    material = _CODE_VALUES[np.where(occupied, boards, 6)].sum(1)
+    counts = np.stack(
+        [(boards == code).sum(1) for code in range(16) if code & 7 < 6], axis=1
+    ).reshape(-1, 2, 6)
+
+    pawns, pieces = _attack_counts(boards)
+    attacks = pawns + pieces
+    own = np.stack([occupied & (boards < 8), boards >= 8], axis=1)
+    kings = np.stack([boards == KING, boards == 8 + KING], axis=1)
+    targets = own & ~kings
+    enemy_attacks = attacks[:, ::-1]
+
+    mobility = (pieces * ~own).sum(2)
+    attacked = (targets & (enemy_attacks > 0)).sum(2)
+    defended = (targets & (attacks > 0)).sum(2)
+    hanging = (targets & (enemy_attacks > 0) & (attacks == 0)).sum(2)
+    in_check = (kings & (enemy_attacks > 0)).any(2)
+    return Features(
+        material, counts, attacks, mobility, attacked, defended, hanging, in_check
+    )
+
+
+# The features of an (N, 64) array of boards as an (N, len(FEATURE_NAMES))
+# float32 matrix, ready to be fed to a model. 'turns' is the side to move of
+# each board.
+def feature_matrix(boards, turns):
+    features = featurize(boards)
+    per_color = [features.counts[:, :, piece] for piece in range(KING)] + [
+        features.mobility,
+        features.attacked,
+        features.defended,
+        features.hanging,
+        features.in_check,
+    ]
+    columns = [np.asarray(turns), features.material] + [
+        values[:, color] for values in per_color for color in (WHITE, BLACK)
+    ]
+    return np.stack(columns, axis=1).astype(np.float32)
+
+
+# Reads a shard of training samples written by export.py. Returns the
+# boards and sides to move (as boards_from_records gives them), the moves
+# played as move codes, the results for white and the legal move masks,
+# still packed as an (N, 512) uint8 array; np.unpackbits(masks, axis=1,
+# bitorder="little") turns them into one flag per start * 64 + end.
+def load_samples(path):
+    data = np.fromfile(path, dtype=np.uint8)
+    magic, count = SHARD_HEADER.unpack_from(data, 0)
+    if magic != SHARD_MAGIC:
+        raise ValueError("not a sample shard: " + repr(path))
+    samples = data[SHARD_HEADER.size :].reshape(-1, SAMPLE_SIZE)[:count]
+    records = np.ascontiguousarray(samples[:, :RECORD_SIZE]).ravel()
+    boards, turns = boards_from_records(records)
+    moves = samples[:, RECORD_SIZE : RECORD_SIZE + 2].copy().view(np.uint16)[:, 0]
+    results = samples[:, RECORD_SIZE + 2].view(np.int8)
+    masks = samples[:, RECORD_SIZE + 8 :]
+    return boards, turns, moves, results, masks
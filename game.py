@@ -1,1190 +1,746 @@
-from tabulate import tabulate
-
-#  Author: Jared Hoppis
-#  This file defines a 'Game' class for a command line version of chess.
-#  The 'Game' class contains all information relevant to a game of chess.
-#  Most of the relevant information is in the squares dictionary.
-
-
-class Game:
-    # setup board and pieces
-    def __init__(self):
-        self.turn_count = (
-            1  # Tracks current turn count. Updated by move_piece function.
-        )
-
-        self.fifty = 0
-        # Tracks last time a pawn was moved or a piece was captured
-        # in order to determine a draw after fifty moves by both players.
-
-        self.rows = range(1, 9)  # Creates the row labels for the chess board
-        self.columns = list("abcdefgh")  # Creates the column labels
-
-        self.squares = (
-            {}
-        )  # This dictionary is the meat of the class. It will contain info about what piece is on
-        # a given square, who the piece belongs to, what diagonals the square belongs to, etc.
-
-        self.diagonals_top_left_bottom_right = dict({k: [] for k in range(15)})
-        # Create diagonals slanting from top
-        # left to bottom k=0 corresponds to a1.
-        # Diagonals are used by is_legal to determine legality of moves for bishops and queens.
-
-        self.diagonals_bottom_left_top_right = dict({n: [] for n in range(15)})
-        # Create diagonals slanting from bottom left to top right
-        #  k=0 corresponds to a8.
-
-        self.black_king = ("e",8)
-        # Property to record the location of black king. Used by is_threat to determine if
-        # black is in check.
-        self.white_king = ("e", 1)
-
-        self.history = {}  # Records all moves
-
-        for i, row in enumerate(
-            self.rows
-        ):  # Filling in the squares dictionary with default info.
-            for j, column in enumerate(self.columns):
-                self.diagonals_top_left_bottom_right[i + j].append((column, row))
-                self.diagonals_bottom_left_top_right[7 - i + j].append((column, row))
-                if ((i + j) % 2) == 0:
-                    self.squares.update(
-                        {
-                            (column, row): dict(
-                                occupied=False, player=False, TLBR=i + j, BLTR=7 - i + j
-                            )
-                        }
-                    )
-                if ((i + j) % 2) == 1:
-                    self.squares.update(
-                        {
-                            (column, row): dict(
-                                occupied=False, player=False, TLBR=i + j, BLTR=7 - i + j
-                            )
-                        }
-                    )
-
-        # putting the pawns rooks knights bishops queens and kings on the board
-        for column in self.columns:
-            self.squares[(column, 2)]["occupied"] = "pawn"
-            self.squares[(column, 2)]["player"] = "white"
-            self.squares[(column, 7)]["occupied"] = "pawn"
-            self.squares[(column, 7)]["player"] = "black"
-        for i in [1, 8]:
-            for j in ["a", "h"]:
-                self.squares[(j, i)]["occupied"] = "rook"
-                self.squares[(j, i)]["castle"] = True
-                if i == 1:
-                    self.squares[(j, i)]["player"] = "white"
-                else:
-                    self.squares[(j, i)]["player"] = "black"
-        for i in [1, 8]:
-            for j in ["b", "g"]:
-                self.squares[(j, i)]["occupied"] = "knight"
-                if i == 1:
-                    self.squares[(j, i)]["player"] = "white"
-                else:
-                    self.squares[(j, i)]["player"] = "black"
-        for i in [1, 8]:
-            for j in ["c", "f"]:
-                self.squares[(j, i)]["occupied"] = "bishop"
-                if i == 1:
-                    self.squares[(j, i)]["player"] = "white"
-                else:
-                    self.squares[(j, i)]["player"] = "black"
-        for i in [1, 8]:
-            self.squares[("d", i)]["occupied"] = "queen"
-            if i == 1:
-                self.squares[("d", i)]["player"] = "white"
-            else:
-                self.squares[("d", i)]["player"] = "black"
-        for i in [1, 8]:
-            self.squares[("e", i)]["occupied"] = "king"
-            self.squares[("e", i)]["castle"] = True
-            if i == 1:
-                self.squares[("e", i)]["player"] = "white"
-            else:
-                self.squares[("e", i)]["player"] = "black"
-
-        for i in [4, 5]:
-            for j in self.columns:
-                self.squares[(j, i)]["en passant"] = [
-                    0,
-                    "-",
-                ]  # This is a flag for the En Passant move. The default
-                # values are never used. They are only defined here to note the format.
-
-    # Constructs a table to display what the board looks like.
-    def visualize(self, player="white"):
-        def abbreviate(piece, color):
-            if piece == "pawn" and color == "white":
-                return "W-p"
-            if piece == "pawn" and color == "black":
-                return "B-p"
-            if piece == "rook" and color == "white":
-                return "W-r"
-            if piece == "rook" and color == "black":
-                return "B-r"
-            if piece == "knight" and color == "white":
-                return "W-n"
-            if piece == "knight" and color == "black":
-                return "B-n"
-            if piece == "bishop" and color == "white":
-                return "W-b"
-            if piece == "bishop" and color == "black":
-                return "B-b"
-            if piece == "queen" and color == "white":
-                return "W-q"
-            if piece == "queen" and color == "black":
-                return "B-q"
-            if piece == "king" and color == "white":
-                return "W-K"
-            if piece == "king" and color == "black":
-                return "B-K"
-            return ""
-
-        table = {}
-        table["white"] = [
-            [
-                (
-                    ((i + j) % 2)
-                    * (not self.squares[self.columns[j], i]["player"])
-                    * "-"
-                    + ((i + j - 1) % 2)
-                    * (not self.squares[self.columns[j], i]["player"])
-                    * "-----"
-                    + abbreviate(
-                        self.squares[self.columns[j], i]["occupied"],
-                        self.squares[self.columns[j], i]["player"],
-                    )
-                )
-                for j in range(len(self.columns))
-            ]
-            for i in range(8, 0, -1)
-        ]
-        table["black"] = list(reversed([list(reversed(row)) for row in table["white"]]))
-
-        if player == "white":
-            print(
-                tabulate(
-                    table["white"],
-                    headers=self.columns,
-                    showindex=list(range(8, 0, -1)),
-                    stralign="center",
-                )
-            )
-        if player == "black":
-            print(
-                tabulate(
-                    table["black"],
-                    headers=list(reversed(self.columns)),
-                    showindex=list(range(1, 9)),
-                    stralign="center",
-                )
-            )
-
-    # Assumes current_pos and end_pos are in the right format.
-    # Checks to see if moving from current_pos to end_pos is a legal move
-    # for player 'color' to make (excluding castling and ignoring check restrictions).
-    def is_legal(self, current_pos, end_pos, color):
-        cur_col_index = self.columns.index(current_pos[0])
-        end_col_index = self.columns.index(end_pos[0])
-        if current_pos == end_pos:
-            return False
-        if color == self.squares[(end_pos[0], int(end_pos[1]))]["player"]:
-            return False
-        # Pawn rules
-        if self.squares[(current_pos[0], int(current_pos[1]))]["occupied"] == "pawn":
-            if current_pos[0] == end_pos[0]:
-                if (
-                    self.squares[(current_pos[0], int(current_pos[1]))]["player"]
-                    == "white"
-                ):
-                    if int(current_pos[1]) == 2:
-                        if (
-                            not self.squares[(current_pos[0], 3)]["occupied"]
-                            and not self.squares[(current_pos[0], 4)]["occupied"]
-                            and int(end_pos[1]) == 4
-                        ):
-                            return True
-                    return bool(
-                        int(current_pos[1]) + 1 == int(end_pos[1])
-                        and not self.squares[(current_pos[0], int(end_pos[1]))][
-                            "occupied"
-                        ]
-                    )
-                if (
-                    self.squares[(current_pos[0], int(current_pos[1]))]["player"]
-                    == "black"
-                ):
-                    if int(current_pos[1]) == 7:
-                        if (
-                            not self.squares[(current_pos[0], 6)]["occupied"]
-                            and not self.squares[(current_pos[0], 5)]["occupied"]
-                            and int(end_pos[1]) == 5
-                        ):
-                            return True
-                    return bool(
-                        int(current_pos[1]) - 1 == int(end_pos[1])
-                        and not self.squares[(current_pos[0], int(end_pos[1]))][
-                            "occupied"
-                        ]
-                    )
-                return False
-            if current_pos[0] != end_pos[0]:
-                if (
-                    self.squares[(current_pos[0], int(current_pos[1]))]["player"]
-                    == "white"
-                ):
-                    if (
-                        cur_col_index + 1 == end_col_index
-                        and int(current_pos[1]) + 1 == int(end_pos[1])
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-                    ):
-                        return True
-                    if (
-                        cur_col_index - 1 == end_col_index
-                        and int(current_pos[1]) + 1 == int(end_pos[1])
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-                    ):
-                        return True
-                    if (
-                        cur_col_index + 1 == end_col_index
-                        and int(current_pos[1]) + 1 == int(end_pos[1])
-                        and int(current_pos[1]) == 5
-                    ):
-                        if self.squares[(current_pos[0], int(current_pos[1]))][
-                            "en passant"
-                        ] == [self.turn_count, self.columns[end_col_index]]:
-                            return True
-                    if (
-                        cur_col_index - 1 == end_col_index
-                        and int(current_pos[1]) + 1 == int(end_pos[1])
-                        and int(current_pos[1]) == 5
-                    ):
-                        if self.squares[(current_pos[0], int(current_pos[1]))][
-                            "en passant"
-                        ] == [self.turn_count, self.columns[end_col_index]]:
-                            return True
-                    return False
-                if (
-                    self.squares[(current_pos[0], int(current_pos[1]))]["player"]
-                    == "black"
-                ):
-                    if (
-                        cur_col_index + 1 == end_col_index
-                        and int(current_pos[1]) - 1 == int(end_pos[1])
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-                    ):
-                        return True
-                    if (
-                        cur_col_index - 1 == end_col_index
-                        and int(current_pos[1]) - 1 == int(end_pos[1])
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-                    ):
-                        return True
-                    if (
-                        cur_col_index + 1 == end_col_index
-                        and int(current_pos[1]) - 1 == int(end_pos[1])
-                        and int(current_pos[1]) == 4
-                    ):
-                        if self.squares[(current_pos[0], int(current_pos[1]))][
-                            "en passant"
-                        ] == [self.turn_count, self.columns[end_col_index]]:
-                            return True
-                    if (
-                        cur_col_index - 1 == end_col_index
-                        and int(current_pos[1]) - 1 == int(end_pos[1])
-                        and int(current_pos[1]) == 4
-                    ):
-                        if self.squares[(current_pos[0], int(current_pos[1]))][
-                            "en passant"
-                        ] == [self.turn_count, self.columns[end_col_index]]:
-                            return True
-                    return False
-                return False
-        # Knight rules
-        if self.squares[(current_pos[0], int(current_pos[1]))]["occupied"] == "knight":
-            return (
-                any(
-                    [
-                        (
-                            int(current_pos[1]) + 2 == int(end_pos[1])
-                            and (
-                                end_col_index in [cur_col_index + 1, cur_col_index - 1]
-                            )
-                        ),
-                        (
-                            int(current_pos[1]) - 2 == int(end_pos[1])
-                            and (
-                                end_col_index in [cur_col_index + 1, cur_col_index - 1]
-                            )
-                        ),
-                        (
-                            cur_col_index - 2 == end_col_index
-                            and (
-                                int(end_pos[1])
-                                in [int(current_pos[1]) + 1, int(current_pos[1]) - 1]
-                            )
-                        ),
-                        (
-                            cur_col_index + 2 == end_col_index
-                            and (
-                                int(end_pos[1])
-                                in [int(current_pos[1]) + 1, int(current_pos[1]) - 1]
-                            )
-                        ),
-                    ]
-                )
-                and (self.squares[(end_pos[0], int(end_pos[1]))]["player"] != color)
-            )
-        # Rook rules
-        if self.squares[(current_pos[0], int(current_pos[1]))]["occupied"] == "rook":
-            if current_pos[0] != end_pos[0] and current_pos[1] != end_pos[1]:
-                return False
-
-            spaces_are_empty = True
-            if current_pos[0] == end_pos[0]:
-                if int(current_pos[1]) < int(end_pos[1]):
-                    for i in range(int(current_pos[1]) + 1, int(end_pos[1])):
-                        if self.squares[(current_pos[0], i)]["occupied"]:
-                            spaces_are_empty = False
-                elif int(current_pos[1]) > int(end_pos[1]):
-                    for i in range(int(current_pos[1]) - 1, int(end_pos[1]), -1):
-                        if self.squares[(current_pos[0], i)]["occupied"]:
-                            spaces_are_empty = False
-                return bool(
-                    spaces_are_empty
-                    and self.squares[(end_pos[0], int(end_pos[1]))]["player"] != color
-                )
-
-            if cur_col_index < end_col_index:
-                for i in range(cur_col_index + 1, end_col_index):
-                    if self.squares[(self.columns[i], int(current_pos[1]))]["occupied"]:
-                        spaces_are_empty = False
-            elif cur_col_index > end_col_index:
-                for i in range(cur_col_index - 1, end_col_index, -1):
-                    if self.squares[(self.columns[i], int(current_pos[1]))]["occupied"]:
-                        spaces_are_empty = False
-            return bool(
-                spaces_are_empty
-                and self.squares[(end_pos[0], int(end_pos[1]))]["player"] != color
-            )
-
-        # Bishop rules
-        if self.squares[(current_pos[0], int(current_pos[1]))]["occupied"] == "bishop":
-            spaces_are_empty = True
-            if (
-                self.squares[(current_pos[0], int(current_pos[1]))]["TLBR"]
-                == self.squares[(end_pos[0], int(end_pos[1]))]["TLBR"]
-            ):
-                cur_diag_index = self.diagonals_top_left_bottom_right[
-                    self.squares[(current_pos[0], int(current_pos[1]))]["TLBR"]
-                ].index((current_pos[0], int(current_pos[1])))
-                end_diag_index = self.diagonals_top_left_bottom_right[
-                    self.squares[(end_pos[0], int(end_pos[1]))]["TLBR"]
-                ].index((end_pos[0], int(end_pos[1])))
-                if cur_diag_index < end_diag_index:
-                    for i in range(cur_diag_index + 1, end_diag_index):
-                        if self.squares[
-                            self.diagonals_top_left_bottom_right[
-                                self.squares[(current_pos[0], int(current_pos[1]))][
-                                    "TLBR"
-                                ]
-                            ][i]
-                        ]["occupied"]:
-                            spaces_are_empty = False
-                    return bool(
-                        spaces_are_empty
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-                        != color
-                    )
-                if cur_diag_index > end_diag_index:
-                    for i in range(cur_diag_index - 1, end_diag_index, -1):
-                        if self.squares[
-                            self.diagonals_top_left_bottom_right[
-                                self.squares[(current_pos[0], int(current_pos[1]))][
-                                    "TLBR"
-                                ]
-                            ][i]
-                        ]["occupied"]:
-                            spaces_are_empty = False
-                    return bool(
-                        spaces_are_empty
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-                        != color
-                    )
-            elif (
-                self.squares[(current_pos[0], int(current_pos[1]))]["BLTR"]
-                == self.squares[(end_pos[0], int(end_pos[1]))]["BLTR"]
-            ):
-                cur_diag_index = self.diagonals_bottom_left_top_right[
-                    self.squares[(current_pos[0], int(current_pos[1]))]["BLTR"]
-                ].index((current_pos[0], int(current_pos[1])))
-                end_diag_index = self.diagonals_bottom_left_top_right[
-                    self.squares[(end_pos[0], int(end_pos[1]))]["BLTR"]
-                ].index((end_pos[0], int(end_pos[1])))
-                if cur_diag_index < end_diag_index:
-                    for i in range(cur_diag_index + 1, end_diag_index):
-                        if self.squares[
-                            self.diagonals_bottom_left_top_right[
-                                self.squares[(current_pos[0], int(current_pos[1]))][
-                                    "BLTR"
-                                ]
-                            ][i]
-                        ]["occupied"]:
-                            spaces_are_empty = False
-                    return bool(
-                        spaces_are_empty
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-                        != color
-                    )
-                if cur_diag_index > end_diag_index:
-                    for i in range(cur_diag_index - 1, end_diag_index, -1):
-                        if self.squares[
-                            self.diagonals_bottom_left_top_right[
-                                self.squares[(current_pos[0], int(current_pos[1]))][
-                                    "BLTR"
-                                ]
-                            ][i]
-                        ]["occupied"]:
-                            spaces_are_empty = False
-                    return bool(
-                        spaces_are_empty
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-                        != color
-                    )
-            return False
-        # Queen rules
-        if self.squares[(current_pos[0], int(current_pos[1]))]["occupied"] == "queen":
-            # Copy of rook movement
-            spaces_are_empty = True
-            if current_pos[0] == end_pos[0]:
-                if int(current_pos[1]) < int(end_pos[1]):
-                    for i in range(int(current_pos[1]) + 1, int(end_pos[1])):
-                        if self.squares[(current_pos[0], i)]["occupied"]:
-                            spaces_are_empty = False
-                elif int(current_pos[1]) > int(end_pos[1]):
-                    for i in range(int(current_pos[1]) - 1, int(end_pos[1]), -1):
-                        if self.squares[(current_pos[0], i)]["occupied"]:
-                            spaces_are_empty = False
-                return bool(
-                    spaces_are_empty
-                    and self.squares[(end_pos[0], int(end_pos[1]))]["player"] != color
-                )
-            if int(current_pos[1]) == int(end_pos[1]):
-                if cur_col_index < end_col_index:
-                    for i in range(cur_col_index + 1, end_col_index):
-                        if self.squares[(self.columns[i], int(current_pos[1]))][
-                            "occupied"
-                        ]:
-                            spaces_are_empty = False
-                elif cur_col_index > end_col_index:
-                    for i in range(cur_col_index - 1, end_col_index, -1):
-                        if self.squares[(self.columns[i], int(current_pos[1]))][
-                            "occupied"
-                        ]:
-                            spaces_are_empty = False
-                return bool(
-                    spaces_are_empty
-                    and self.squares[(end_pos[0], int(end_pos[1]))]["player"] != color
-                )
-            # Copy of Bishop movement
-            if (
-                self.squares[(current_pos[0], int(current_pos[1]))]["TLBR"]
-                == self.squares[(end_pos[0], int(end_pos[1]))]["TLBR"]
-            ):
-                cur_diag_index = self.diagonals_top_left_bottom_right[
-                    self.squares[(current_pos[0], int(current_pos[1]))]["TLBR"]
-                ].index((current_pos[0], int(current_pos[1])))
-                end_diag_index = self.diagonals_top_left_bottom_right[
-                    self.squares[(end_pos[0], int(end_pos[1]))]["TLBR"]
-                ].index((end_pos[0], int(end_pos[1])))
-                if cur_diag_index < end_diag_index:
-                    for i in range(cur_diag_index + 1, end_diag_index):
-                        if self.squares[
-                            self.diagonals_top_left_bottom_right[
-                                self.squares[(current_pos[0], int(current_pos[1]))][
-                                    "TLBR"
-                                ]
-                            ][i]
-                        ]["occupied"]:
-                            spaces_are_empty = False
-                    return bool(
-                        spaces_are_empty
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-                        != color
-                    )
-                if cur_diag_index > end_diag_index:
-                    for i in range(cur_diag_index - 1, end_diag_index, -1):
-                        if self.squares[
-                            self.diagonals_top_left_bottom_right[
-                                self.squares[(current_pos[0], int(current_pos[1]))][
-                                    "TLBR"
-                                ]
-                            ][i]
-                        ]["occupied"]:
-                            spaces_are_empty = False
-                    return bool(
-                        spaces_are_empty
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-                        != color
-                    )
-            if (
-                self.squares[(current_pos[0], int(current_pos[1]))]["BLTR"]
-                == self.squares[(end_pos[0], int(end_pos[1]))]["BLTR"]
-            ):
-                cur_diag_index = self.diagonals_bottom_left_top_right[
-                    self.squares[(current_pos[0], int(current_pos[1]))]["BLTR"]
-                ].index((current_pos[0], int(current_pos[1])))
-                end_diag_index = self.diagonals_bottom_left_top_right[
-                    self.squares[(end_pos[0], int(end_pos[1]))]["BLTR"]
-                ].index((end_pos[0], int(end_pos[1])))
-                if cur_diag_index < end_diag_index:
-                    for i in range(cur_diag_index + 1, end_diag_index):
-                        if self.squares[
-                            self.diagonals_bottom_left_top_right[
-                                self.squares[(current_pos[0], int(current_pos[1]))][
-                                    "BLTR"
-                                ]
-                            ][i]
-                        ]["occupied"]:
-                            spaces_are_empty = False
-                    return bool(
-                        spaces_are_empty
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-                        != color
-                    )
-                if cur_diag_index > end_diag_index:
-                    for i in range(cur_diag_index - 1, end_diag_index, -1):
-                        if self.squares[
-                            self.diagonals_bottom_left_top_right[
-                                self.squares[(current_pos[0], int(current_pos[1]))][
-                                    "BLTR"
-                                ]
-                            ][i]
-                        ]["occupied"]:
-                            spaces_are_empty = False
-                    return bool(
-                        spaces_are_empty
-                        and self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-                        != color
-                    )
-            return False
-        # King rules
-        if self.squares[(current_pos[0], int(current_pos[1]))]["occupied"] == "king":
-            return bool(
-                end_col_index in [cur_col_index - 1, cur_col_index, cur_col_index + 1]
-                and int(end_pos[1])
-                in [
-                    int(current_pos[1]) - 1,
-                    int(current_pos[1]),
-                    int(current_pos[1]) + 1,
-                ]
-                and self.squares[(end_pos[0], int(end_pos[1]))]["player"] != color
-            )
-        return False
-
-    # Again assumes current_pos and end_pos are in the right format.
-    # Determines if the given move will put player 'color' in check.
-    # If so, gives the row and column of the first piece found that will create check.
-    def is_threat(self, current_pos, end_pos, color):
-        if (
-            self.squares[(current_pos[0], int(current_pos[1]))]["occupied"] == "king"
-            and color == "white"
-        ):
-            self.white_king = (end_pos[0], int(end_pos[1]))
-        elif (
-            self.squares[(current_pos[0], int(current_pos[1]))]["occupied"] == "king"
-            and color == "black"
-        ):
-            self.black_king = (end_pos[0], int(end_pos[1]))
-        # Save status of square that will be moved into, then make the move,
-        # and then see if the other color can make a move that would take
-        # the king. Finally, move the pieces back and return result.
-        save_piece = self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-        save_player = self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-        self.squares[(end_pos[0], int(end_pos[1]))]["occupied"] = self.squares[
-            (current_pos[0], int(current_pos[1]))
-        ]["occupied"]
-        self.squares[(end_pos[0], int(end_pos[1]))]["player"] = self.squares[
-            (current_pos[0], int(current_pos[1]))
-        ]["player"]
-        self.squares[(current_pos[0], int(current_pos[1]))]["occupied"] = False
-        self.squares[(current_pos[0], int(current_pos[1]))]["player"] = False
-        if color == "white":
-            for i in self.rows:
-                for j in self.columns:
-                    if self.squares[(j, i)]["player"] == "black":
-                        if self.is_legal((j, i), self.white_king, "black"):
-                            self.squares[(current_pos[0], int(current_pos[1]))][
-                                "occupied"
-                            ] = self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-                            self.squares[(current_pos[0], int(current_pos[1]))][
-                                "player"
-                            ] = self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-                            self.squares[(end_pos[0], int(end_pos[1]))][
-                                "occupied"
-                            ] = save_piece
-                            self.squares[(end_pos[0], int(end_pos[1]))][
-                                "player"
-                            ] = save_player
-                            if (
-                                self.squares[(current_pos[0], int(current_pos[1]))][
-                                    "occupied"
-                                ]
-                                == "king"
-                            ):
-                                self.white_king = (current_pos[0], int(current_pos[1]))
-                            return True, i, j
-            self.squares[(current_pos[0], int(current_pos[1]))][
-                "occupied"
-            ] = self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-            self.squares[(current_pos[0], int(current_pos[1]))][
-                "player"
-            ] = self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-            self.squares[(end_pos[0], int(end_pos[1]))]["occupied"] = save_piece
-            self.squares[(end_pos[0], int(end_pos[1]))]["player"] = save_player
-            if (
-                self.squares[(current_pos[0], int(current_pos[1]))]["occupied"]
-                == "king"
-            ):
-                self.white_king = (current_pos[0], int(current_pos[1]))
-            return False, -1, -1
-        # ------------------------
-        if color == "black":
-            for i in self.rows:
-                for j in self.columns:
-                    if self.squares[(j, i)]["player"] == "white":
-                        if self.is_legal((j, i), self.black_king, "white"):
-                            self.squares[(current_pos[0], int(current_pos[1]))][
-                                "occupied"
-                            ] = self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-                            self.squares[(current_pos[0], int(current_pos[1]))][
-                                "player"
-                            ] = self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-                            self.squares[(end_pos[0], int(end_pos[1]))][
-                                "occupied"
-                            ] = save_piece
-                            self.squares[(end_pos[0], int(end_pos[1]))][
-                                "player"
-                            ] = save_player
-                            if (
-                                self.squares[(current_pos[0], int(current_pos[1]))][
-                                    "occupied"
-                                ]
-                                == "king"
-                            ):
-                                self.black_king = (current_pos[0], int(current_pos[1]))
-                            return True, i, j
-            self.squares[(current_pos[0], int(current_pos[1]))][
-                "occupied"
-            ] = self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-            self.squares[(current_pos[0], int(current_pos[1]))][
-                "player"
-            ] = self.squares[(end_pos[0], int(end_pos[1]))]["player"]
-            self.squares[(end_pos[0], int(end_pos[1]))]["occupied"] = save_piece
-            self.squares[(end_pos[0], int(end_pos[1]))]["player"] = save_player
-            if (
-                self.squares[(current_pos[0], int(current_pos[1]))]["occupied"]
-                == "king"
-            ):
-                self.black_king = (current_pos[0], int(current_pos[1]))
-            return False, -1, -1
-        return False, -1, -1
-
-    # Again assumes current_pos and end_pos are in the right format.
-    # Determines if the given move is a valid castle.
-    def is_legal_castle(self, current_pos, end_pos, color):
-        if all(
-            [
-                color == "white",
-                (end_pos[0], int(end_pos[1])) in [("c", 1), ("g", 1)],
-                (current_pos[0], int(current_pos[1])) == ("e", 1),
-            ]
-        ):
-            if (
-                self.squares[(current_pos[0], int(current_pos[1]))]["castle"]
-                and not self.is_threat(current_pos, current_pos, color)[0]
-            ):
-                if end_pos[0] == "c" and not self.squares[("b", 1)]["occupied"]:
-                    if self.squares[("a", 1)]["castle"]:
-                        for i in ["c", "d"]:
-                            if (
-                                self.squares[(i, 1)]["occupied"]
-                                or self.is_threat(current_pos, (i, 1), "white")[0]
-                            ):
-                                return False
-                        return True
-                if end_pos[0] == "g":
-                    if self.squares[("h", 1)]["castle"]:
-                        for i in ["f", "g"]:
-                            if (
-                                self.squares[(i, 1)]["occupied"]
-                                or self.is_threat(current_pos, (i, 1), "white")[0]
-                            ):
-                                return False
-                        return True
-            return False
-        if all(
-            [
-                color == "black",
-                (end_pos[0], int(end_pos[1])) in [("c", 8), ("g", 8)],
-                (current_pos[0], int(current_pos[1])) == ("e", 8),
-            ]
-        ):
-            if (
-                self.squares[(current_pos[0], int(current_pos[1]))]["castle"]
-                and not self.is_threat(current_pos, current_pos, color)[0]
-            ):
-                if end_pos[0] == "c" and not self.squares[("b", 8)]["occupied"]:
-                    if self.squares[("a", 8)]["castle"]:
-                        for i in ["c", "d"]:
-                            if (
-                                self.squares[(i, 8)]["occupied"]
-                                or self.is_threat(current_pos, (i, 8), "white")[0]
-                            ):
-                                return False
-                        return True
-                if end_pos[0] == "g":
-                    if self.squares[("h", 8)]["castle"]:
-                        for i in ["f", "g"]:
-                            if (
-                                self.squares[(i, 8)]["occupied"]
-                                or self.is_threat(current_pos, (i, 8), "white")[0]
-                            ):
-                                return False
-                        return True
-            return False
-        return False
-
-    # First asks user to input a square to move from.
-    # Checks to see if the input is in the correct format and that the
-    # selected square contains a piece belonging to 'color'.
-    # Then asks user to input a square to move to, and uses the above
-    # functions to determine if it is a legal move.
-    # If it is, the function moves the piece, if not, it asks for another input.
-    # The 'color' argument determines which player is moving a piece.
-    def move_piece(self, color):
-        while True:
-            while True:
-                current_pos = input(
-                    "What piece would you ("
-                    + str(color)
-                    + ") like to move? Type 'help' for assistance.\nInput:"
-                )
-                if current_pos == "help":
-                    print(
-                        "To make a move, type the column letter followed by the row number\n"
-                        + "of the piece you would like to move.\n"
-                        + "Another query will follow asking you where you would\n"
-                        + "like to move that piece. Example: 'c3'."
-                    )
-                    continue
-                if (
-                    isinstance(current_pos, str)
-                    and len(current_pos) == 2
-                    and current_pos[0] in self.columns
-                    and int(current_pos[1]) in self.rows
-                    and color
-                    == self.squares[(current_pos[0], int(current_pos[1]))]["player"]
-                ):
-                    print("Input received.")
-                    break
-
-                print(
-                    "You either typed something that wasn't a square, that square is\n"
-                    + "unoccupied, or you do not own that piece."
-                )
-                x.visualize(color)
-                continue
-            while True:
-                end_pos = input(
-                    "Where would you like to move your "
-                    + str(
-                        self.squares[(current_pos[0], int(current_pos[1]))]["occupied"]
-                    )
-                    + " (currently at "
-                    + current_pos
-                    + ") to?\nInput:"
-                )
-                if end_pos == "help":
-                    print(
-                        "To finish making a move, type the column letter followed by the row\n"
-                        + "number of the square you would like to move the piece to.\n"
-                        + "Example: 'c3'. If you want to select a different piece, type 'back'."
-                    )
-                    continue
-                if end_pos == "back":
-                    break
-                if not (
-                    isinstance(end_pos, str)
-                    and len(end_pos) == 2
-                    and end_pos[0] in self.columns
-                    and int(end_pos[1]) in self.rows
-                ):
-                    print("You typed something that wasn't a valid square.")
-                    self.visualize(color)
-                    continue
-                if (
-                    isinstance(end_pos, str)
-                    and len(end_pos) == 2
-                    and end_pos[0] in self.columns
-                    and int(end_pos[1]) in self.rows
-                    and (
-                        self.is_legal(current_pos, end_pos, color)
-                        or self.is_legal_castle(current_pos, end_pos, color)
-                    )
-                ):
-                    break
-                if (
-                    isinstance(end_pos, str)
-                    and len(end_pos) == 2
-                    and end_pos[0] in self.columns
-                    and int(end_pos[1]) in self.rows
-                    and not self.is_legal(current_pos, end_pos, color)
-                    and not self.is_legal_castle(current_pos, end_pos, color)
-                ):
-                    print("That is not a legal move.")
-                    self.visualize(color)
-                    break
-
-            if self.is_legal(current_pos, end_pos, color):
-                is_threat_temp = self.is_threat(current_pos, end_pos, color)
-                if is_threat_temp[0]:
-                    i = is_threat_temp[1]
-                    j = is_threat_temp[2]
-                    print(
-                        "That move would place white in check from "
-                        + str(self.squares[(j, i)]["occupied"])
-                        + " at "
-                        + str(j)
-                        + str(i)
-                        + "."
-                    )
-                else:
-                    cur_col_index = self.columns.index(current_pos[0])
-                    end_col_index = self.columns.index(end_pos[0])
-                    if (
-                        self.squares[(current_pos[0], int(current_pos[1]))]["occupied"]
-                        == "king"
-                    ):
-                        if color == "white":
-                            self.white_king = (end_pos[0], int(end_pos[1]))
-                        elif color == "black":
-                            self.black_king = (end_pos[0], int(end_pos[1]))
-                    # Keeping track of game progress for the fifty move rule
-                    if (
-                        self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-                        or self.squares[(current_pos[0], int(current_pos[1]))][
-                            "occupied"
-                        ]
-                        == "pawn"
-                    ):
-                        self.fifty = self.turn_count
-                    # Flagging for en passant
-                    if (
-                        self.squares[(current_pos[0], int(current_pos[1]))]["player"]
-                        == "white"
-                        and self.squares[(current_pos[0], int(current_pos[1]))][
-                            "occupied"
-                        ]
-                        == "pawn"
-                    ):
-                        if int(current_pos[1]) == 2:
-                            if (
-                                not self.squares[(current_pos[0], 3)]["occupied"]
-                                and not self.squares[(current_pos[0], 4)]["occupied"]
-                                and int(end_pos[1]) == 4
-                            ):
-                                if cur_col_index > 0:
-                                    self.squares[(self.columns[cur_col_index - 1], 4)][
-                                        "en passant"
-                                    ] = [
-                                        self.turn_count + 1,
-                                        self.columns[cur_col_index],
-                                    ]
-                                if cur_col_index < 7:
-                                    self.squares[(self.columns[cur_col_index + 1], 4)][
-                                        "en passant"
-                                    ] = [
-                                        self.turn_count + 1,
-                                        self.columns[cur_col_index],
-                                    ]
-                        elif (
-                            not self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-                            and cur_col_index != end_col_index
-                        ):
-                            self.squares[(end_pos[0], int(current_pos[1]))][
-                                "occupied"
-                            ] = False
-                            self.squares[(end_pos[0], int(current_pos[1]))][
-                                "player"
-                            ] = False
-                    if (
-                        self.squares[(current_pos[0], int(current_pos[1]))]["player"]
-                        == "black"
-                        and self.squares[(current_pos[0], int(current_pos[1]))][
-                            "occupied"
-                        ]
-                        == "pawn"
-                    ):
-                        if int(current_pos[1]) == 7:
-                            if (
-                                not self.squares[(current_pos[0], 6)]["occupied"]
-                                and not self.squares[(current_pos[0], 5)]["occupied"]
-                                and int(end_pos[1]) == 5
-                            ):
-                                if cur_col_index > 0:
-                                    self.squares[(self.columns[cur_col_index - 1], 5)][
-                                        "en passant"
-                                    ] = [
-                                        self.turn_count + 1,
-                                        self.columns[cur_col_index],
-                                    ]
-                                if cur_col_index < 7:
-                                    self.squares[(self.columns[cur_col_index + 1], 5)][
-                                        "en passant"
-                                    ] = [
-                                        self.turn_count + 1,
-                                        self.columns[cur_col_index],
-                                    ]
-                        elif (
-                            not self.squares[(end_pos[0], int(end_pos[1]))]["occupied"]
-                            and cur_col_index != end_col_index
-                        ):
-                            self.squares[(end_pos[0], int(current_pos[1]))][
-                                "occupied"
-                            ] = False
-                            self.squares[(end_pos[0], int(current_pos[1]))][
-                                "player"
-                            ] = False
-                    # Making sure a rook that's moved won't be able to castle.
-                    if self.squares[(current_pos[0], int(current_pos[1]))][
-                        "occupied"
-                    ] == "rook" and (current_pos[0], int(current_pos[1])) in [
-                        ("a", 1),
-                        ("a", 8),
-                        ("h", 1),
-                        ("h", 8),
-                    ]:
-                        self.squares[(current_pos[0], int(current_pos[1]))][
-                            "castle"
-                        ] = False
-                    self.history[self.turn_count] = (
-                        self.squares[(current_pos[0], int(current_pos[1]))]["occupied"],
-                        (current_pos[0], int(current_pos[1])),
-                        (end_pos[0], int(end_pos[1])),
-                    )
-
-                    self.squares[(end_pos[0], int(end_pos[1]))][
-                        "player"
-                    ] = self.squares[(current_pos[0], int(current_pos[1]))]["player"]
-                    self.squares[(end_pos[0], int(end_pos[1]))][
-                        "occupied"
-                    ] = self.squares[(current_pos[0], int(current_pos[1]))]["occupied"]
-                    self.squares[(current_pos[0], int(current_pos[1]))][
-                        "player"
-                    ] = False
-                    self.squares[(current_pos[0], int(current_pos[1]))][
-                        "occupied"
-                    ] = False
-                    print("Move completed.")
-                    self.turn_count += 1
-                    if self.squares[(end_pos[0], int(end_pos[1]))][
-                        "occupied"
-                    ] == "pawn" and int(end_pos[1]) in [1, 8]:
-                        while True:
-                            promo = input(
-                                "What piece would you like to promote your pawn to? Type\n"
-                                "queen, rook, knight, or bishop."
-                            )
-                            if promo not in ["queen", "rook", "knight", "bishop"]:
-                                print("Invalid selection. Try again.")
-                                continue
-
-                            self.squares[(end_pos[0], int(end_pos[1]))][
-                                "occupied"
-                            ] = promo
-                            break
-                    if color == "white":
-                        self.visualize(player="black")
-                    else:
-                        self.visualize(player="white")
-                    break
-
-            elif self.is_legal_castle(current_pos, end_pos, color):
-                if color == "white":
-                    self.white_king = (end_pos[0], int(end_pos[1]))
-                elif color == "black":
-                    self.black_king = (end_pos[0], int(end_pos[1]))
-                self.history[self.turn_count] = (
-                    self.squares[(current_pos[0], int(current_pos[1]))]["occupied"],
-                    (current_pos[0], int(current_pos[1])),
-                    (end_pos[0], int(end_pos[1])),
-                )
-                self.squares[(end_pos[0], int(end_pos[1]))]["player"] = self.squares[
-                    (current_pos[0], int(current_pos[1]))
-                ]["player"]
-                self.squares[(end_pos[0], int(end_pos[1]))]["occupied"] = self.squares[
-                    (current_pos[0], int(current_pos[1]))
-                ]["occupied"]
-                self.squares[(current_pos[0], int(current_pos[1]))]["player"] = False
-                self.squares[(current_pos[0], int(current_pos[1]))]["occupied"] = False
-                if (end_pos[0], int(end_pos[1])) == ("c", 1):
-                    self.squares[("a", 1)]["occupied"] = False
-                    self.squares[("a", 1)]["player"] = False
-                    self.squares[("d", 1)]["occupied"] = "rook"
-                    self.squares[("d", 1)]["player"] = color
-                if (end_pos[0], int(end_pos[1])) == ("g", 1):
-                    self.squares[("h", 1)]["occupied"] = False
-                    self.squares[("h", 1)]["player"] = False
-                    self.squares[("f", 1)]["occupied"] = "rook"
-                    self.squares[("f", 1)]["player"] = color
-                if (end_pos[0], int(end_pos[1])) == ("c", 8):
-                    self.squares[("a", 8)]["occupied"] = False
-                    self.squares[("a", 8)]["player"] = False
-                    self.squares[("d", 8)]["occupied"] = "rook"
-                    self.squares[("d", 8)]["player"] = color
-                if (end_pos[0], int(end_pos[1])) == ("g", 8):
-                    self.squares[("h", 8)]["occupied"] = False
-                    self.squares[("h", 8)]["player"] = False
-                    self.squares[("f", 8)]["occupied"] = "rook"
-                    self.squares[("f", 8)]["player"] = color
-                print("Move completed.")
-                self.turn_count += 1
-                if color == "white":
-                    self.visualize(player="black")
-                else:
-                    self.visualize(player="white")
-                break
-            elif not self.is_legal_castle(current_pos, end_pos, color):
-                continue
-
-    # Checks for game end conditions, checkmate or stalemate either
-    # due to unavailability of legal moves w/o check or fifty moves
-    # have passed for both players without a captured piece or pawn moved.
-    # The fifty move rule comes from tournament chess, despite some
-    # conditions existing where more than fifty moves are needed to
-    # force checkmate.
-    def end(self, color):  # See if 'color' wins the game.
-        in_check = False
-        is_fifty = self.turn_count - self.fifty
-        if color == "white":
-            for cur_row in self.rows:
-                for cur_col in self.columns:
-                    if self.squares[(cur_col, cur_row)]["player"] == "white":
-                        in_check = self.is_legal(
-                            (cur_col, cur_row), self.black_king, "white"
-                        )
-                    if self.squares[(cur_col, cur_row)]["player"] == "black":
-                        for end_row in self.rows:
-                            for end_col in self.columns:
-                                if (
-                                    self.squares[(end_col, end_row)]["player"]
-                                    != "black"
-                                ):
-                                    if self.is_legal(
-                                        (cur_col, cur_row), (end_col, end_row), "black"
-                                    ):
-                                        if (
-                                            not self.is_threat(
-                                                (cur_col, cur_row),
-                                                (end_col, end_row),
-                                                "black",
-                                            )[0]
-                                            and is_fifty < 101
-                                        ):
-                                            return False
-            if in_check and is_fifty < 101:
-                return "checkmate"
-            if not in_check and is_fifty < 101:
-                return "stalemate"
-            if is_fifty >= 101:
-                return "stalemate"
-        elif color == "black":
-            for cur_row in self.rows:
-                for cur_col in self.columns:
-                    if self.squares[(cur_col, cur_row)]["player"] == "black":
-                        if self.is_legal((cur_col, cur_row), self.white_king, "black"):
-                            in_check = True
-                    if self.squares[(cur_col, cur_row)]["player"] == "white":
-                        for end_row in self.rows:
-                            for end_col in self.columns:
-                                if (
-                                    self.squares[(end_col, end_row)]["player"]
-                                    != "white"
-                                ):
-                                    if self.is_legal(
-                                        (cur_col, cur_row), (end_col, end_row), "white"
-                                    ):
-                                        if (
-                                            not self.is_threat(
-                                                (cur_col, cur_row),
-                                                (end_col, end_row),
-                                                "white",
-                                            )[0]
-                                            and is_fifty < 101
-                                        ):
-                                            return False
-            if in_check and is_fifty < 101:
-                return "checkmate"
-            if not in_check and is_fifty < 101:
-                return "stalemate"
-            if is_fifty >= 101:
-                return "stalemate"
-        return False
-
-
-if __name__ == "__main__":
-    x = Game()
-
-    try:
-        x.visualize(player="white")
-        while True:
-            x.move_piece("white")
-            end = x.end("white")
-            if end == "checkmate":
-                print("White wins the game!")
-                break
-            if end == "stalemate":
-                print("The game is a draw.")
-                break
-            black_threat = x.is_threat(x.black_king, x.black_king, "black")
-            if black_threat[0]:
-                print(
-                    "Black is in check from "
-                    + str(
-                        x.squares[(black_threat[2], black_threat[1])]["occupied"]
-                        + " located at "
-                        + str(black_threat[2])
-                        + str(black_threat[1])
-                        + "."
-                    )
-                )
-            x.move_piece("black")
-            end = x.end("black")
-            if end == "checkmate":
-                print("Black wins the game!")
-                break
-            if end == "stalemate":
-                print("The game is a draw.")
-                break
-            white_threat = x.is_threat(x.white_king, x.white_king, "white")
-            if white_threat[0]:
-                print(
-                    "White is in check from "
-                    + str(
-                        x.squares[(white_threat[2], white_threat[1])]["occupied"]
-                        + " located at "
-                        + str(white_threat[2])
-                        + str(white_threat[1])
-                        + "."
-                    )
-                )
-        for key in x.history:
-            print(str(key) + ": " + str(x.history[key]))
-    except KeyboardInterrupt:
-        print("\n \nYou flipped the table!!!")
-        for key in x.history:
-            print(str(key) + ": " + str(x.history[key]))
+from array import array
+from types import MappingProxyType
+
+from tabulate import tabulate
+
+from bitboard import (
+    BLACK,
+    BLACK_KINGSIDE,
+    BLACK_QUEENSIDE,
+    COLORS,
+    KING,
+    PAWN,
+    PIECES,
+    ROOK,
+    WHITE,
+    WHITE_KINGSIDE,
+    WHITE_QUEENSIDE,
+    Move,
+    Position,
+    square,
+    square_position,
+)
+from movegen import generate_legal, legal_moves, perft
+
+#  Author: Jared Hoppis
+#  This file defines a 'Game' class for a command line version of chess.
+#  The 'Game' class contains all information relevant to a game of chess.
+#  The board itself is stored as a bitboard 'Position' (see bitboard.py).
+#  The squares dictionary is still available as a view derived from it.
+
+# The board geometry never changes, so it is worked out once here and
+# shared by every game rather than rebuilt for each one. None of these
+# tables may be changed.
+ROWS = range(1, 9)  # The row labels of the chess board
+COLUMNS = tuple("abcdefgh")  # The column labels
+
+# The diagonal slanting from top left to bottom right that each square lies
+# on (0 is the one through a1), and the one slanting from bottom left to top
+# right (0 is the one through a8).
+TLBR = tuple(sq // 8 + sq % 8 for sq in range(64))
+BLTR = tuple(7 - sq // 8 + sq % 8 for sq in range(64))
+
+
+# The squares of each diagonal in the ('e', 2) format, keyed by the
+# diagonal numbers in 'numbers' (TLBR or BLTR).
+def _diagonals(numbers):
+    diagonals = {k: [] for k in range(15)}
+    for sq in range(64):
+        diagonals[numbers[sq]].append(square_position(sq))
+    return MappingProxyType({k: tuple(squares) for k, squares in diagonals.items()})
+
+
+DIAGONALS_TLBR = _diagonals(TLBR)
+DIAGONALS_BLTR = _diagonals(BLTR)
+
+# Every new game without a position of its own starts from a copy of this
+# one, which is much cheaper than setting up the pieces again.
+_STARTING_POSITION = Position.starting()
+
+
+# Packs a move and the state it destroys into one number for the undo
+# stack: the squares (6 bits each), the piece, the captured piece and the
+# promotion (3 bits each, plus one so that 0 stands for None), the kind
+# (2 bits), the castling rights (4 bits), the en passant square (7 bits,
+# plus one) and the halfmove clock (the rest).
+def _pack_undo(move, castling, ep_square, halfmove):
+    captured = 0 if move.captured is None else move.captured + 1
+    promotion = 0 if move.promotion is None else move.promotion + 1
+    ep = 0 if ep_square is None else ep_square + 1
+    return (
+        move.start
+        | move.end << 6
+        | move.piece << 12
+        | captured << 15
+        | promotion << 18
+        | move.kind << 21
+        | castling << 23
+        | ep << 27
+        | halfmove << 34
+    )
+
+
+# The move packed by _pack_undo.
+def _unpack_move(entry):
+    captured = entry >> 15 & 7
+    promotion = entry >> 18 & 7
+    return Move(
+        entry & 63,
+        entry >> 6 & 63,
+        entry >> 12 & 7,
+        captured - 1 if captured else None,
+        promotion - 1 if promotion else None,
+        entry >> 21 & 3,
+    )
+
+
+class Game:
+    __slots__ = (
+        "turn_count",
+        "fifty",
+        "position",
+        "_squares",
+        "_undo",
+        "repetitions",
+    )
+
+    # Shared by all games; see the tables above.
+    rows = ROWS
+    columns = COLUMNS
+    diagonals_top_left_bottom_right = DIAGONALS_TLBR
+    diagonals_bottom_left_top_right = DIAGONALS_BLTR
+
+    # setup board and pieces. A 'Position' can be passed in to start from
+    # somewhere other than the normal starting setup.
+    def __init__(self, position=None):
+        self.turn_count = 1  # Tracks current turn count. Updated by make_move.
+
+        self.fifty = 0
+        # Tracks last time a pawn was moved or a piece was captured
+        # in order to determine a draw after fifty moves by both players.
+
+        if position is None:
+            position = _STARTING_POSITION.copy()
+        self.position = position
+        # The bitboards holding the pieces, the side to move, castling
+        # rights and the en passant square. All rules are checked against it.
+
+        self._squares = None
+        # Cache for the squares view. Cleared whenever the position changes.
+
+        self._undo = array("Q")
+        # Two numbers per move played: the move and the state it destroyed,
+        # packed by _pack_undo, and the hash of the position before it.
+        # Packing them keeps a long game small; the move stack and the
+        # history are read from it when asked for.
+
+        self.repetitions = {self.position.hash: 1}
+        # Counts how often each position (by its Zobrist hash) has occurred
+        # since the last capture or pawn move. Earlier positions can never
+        # come back, so the counts are cleared whenever one happens.
+
+    # Locations of the kings in the ('e', 1) format.
+    @property
+    def white_king(self):
+        return square_position(self.position.king(WHITE))
+
+    @property
+    def black_king(self):
+        return square_position(self.position.king(BLACK))
+
+    # Sets up a game from a FEN string, including the halfmove clock and the
+    # fullmove number, which are turned into 'fifty' and 'turn_count'.
+    # Raises ValueError if the FEN is not valid.
+    @classmethod
+    def from_fen(cls, fen):
+        fields = fen.split()
+        position = Position.from_fen(fen)
+        try:
+            halfmove = int(fields[4]) if len(fields) > 4 else 0
+            fullmove = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("invalid move counters: " + repr(fen)) from None
+        if halfmove < 0 or fullmove < 1:
+            raise ValueError("invalid move counters: " + repr(fen))
+        return cls.from_position(position, halfmove, fullmove)
+
+    # Sets up a game from a Position and the FEN style halfmove clock and
+    # fullmove number.
+    @classmethod
+    def from_position(cls, position, halfmove=0, fullmove=1):
+        game = cls(position)
+        game.turn_count = 2 * fullmove - (1 if position.turn == WHITE else 0)
+        game.fifty = game.turn_count - halfmove - 1
+        return game
+
+    # Describes the current position as a FEN string.
+    def to_fen(self):
+        halfmove = self.turn_count - self.fifty - 1
+        fullmove = (self.turn_count + 1) // 2
+        return self.position.to_fen() + " " + str(halfmove) + " " + str(fullmove)
+
+    # A 64-bit Zobrist hash of the position covering the pieces, the side to
+    # move, castling rights and en passant. Equal positions have equal keys.
+    @property
+    def position_key(self):
+        return self.position.hash
+
+    # The squares dictionary contains info about what piece is on a given
+    # square, who the piece belongs to, what diagonals the square belongs to,
+    # etc. It is derived from the position the first time it is read after
+    # a move, so it should be treated as read-only.
+    @property
+    def squares(self):
+        if self._squares is None:
+            self._squares = self._build_squares()
+        return self._squares
+
+    def _build_squares(self):
+        position = self.position
+        squares = {}
+        for i, row in enumerate(self.rows):
+            for j, column in enumerate(self.columns):
+                found = position.piece_at(i * 8 + j)
+                squares[(column, row)] = dict(
+                    occupied=PIECES[found[1]] if found else False,
+                    player=COLORS[found[0]] if found else False,
+                    TLBR=TLBR[i * 8 + j],
+                    BLTR=BLTR[i * 8 + j],
+                )
+        castling = position.castling
+        squares[("a", 1)]["castle"] = bool(castling & WHITE_QUEENSIDE)
+        squares[("h", 1)]["castle"] = bool(castling & WHITE_KINGSIDE)
+        squares[("e", 1)]["castle"] = bool(
+            castling & (WHITE_KINGSIDE | WHITE_QUEENSIDE)
+        )
+        squares[("a", 8)]["castle"] = bool(castling & BLACK_QUEENSIDE)
+        squares[("h", 8)]["castle"] = bool(castling & BLACK_KINGSIDE)
+        squares[("e", 8)]["castle"] = bool(
+            castling & (BLACK_KINGSIDE | BLACK_QUEENSIDE)
+        )
+        # The en passant flag on a pawn's square holds the turn on which it
+        # may capture and the column it captures on, or [0, "-"].
+        ep_square = position.ep_square
+        for row in [4, 5]:
+            for column in self.columns:
+                squares[(column, row)]["en passant"] = [0, "-"]
+        if ep_square is not None:
+            row = 5 if ep_square >= 40 else 4
+            column, _ = square_position(ep_square)
+            pawns = position.pieces[WHITE if row == 5 else BLACK][PAWN]
+            for col_index in [ord(column) - 98, ord(column) - 96]:
+                if 0 <= col_index < 8 and pawns & (1 << ((row - 1) * 8 + col_index)):
+                    squares[(self.columns[col_index], row)]["en passant"] = [
+                        self.turn_count,
+                        column,
+                    ]
+        return squares
+
+    # Constructs a table to display what the board looks like.
+    def visualize(self, player="white"):
+        def abbreviate(piece, color):
+            if piece == "pawn" and color == "white":
+                return "W-p"
+            if piece == "pawn" and color == "black":
+                return "B-p"
+            if piece == "rook" and color == "white":
+                return "W-r"
+            if piece == "rook" and color == "black":
+                return "B-r"
+            if piece == "knight" and color == "white":
+                return "W-n"
+            if piece == "knight" and color == "black":
+                return "B-n"
+            if piece == "bishop" and color == "white":
+                return "W-b"
+            if piece == "bishop" and color == "black":
+                return "B-b"
+            if piece == "queen" and color == "white":
+                return "W-q"
+            if piece == "queen" and color == "black":
+                return "B-q"
+            if piece == "king" and color == "white":
+                return "W-K"
+            if piece == "king" and color == "black":
+                return "B-K"
+            return ""
+
+        table = {}
+        table["white"] = [
+            [
+                (
+                    ((i + j) % 2)
+                    * (not self.squares[self.columns[j], i]["player"])
+                    * "-"
+                    + ((i + j - 1) % 2)
+                    * (not self.squares[self.columns[j], i]["player"])
+                    * "-----"
+                    + abbreviate(
+                        self.squares[self.columns[j], i]["occupied"],
+                        self.squares[self.columns[j], i]["player"],
+                    )
+                )
+                for j in range(len(self.columns))
+            ]
+            for i in range(8, 0, -1)
+        ]
+        table["black"] = list(reversed([list(reversed(row)) for row in table["white"]]))
+
+        if player == "white":
+            print(
+                tabulate(
+                    table["white"],
+                    headers=self.columns,
+                    showindex=list(range(8, 0, -1)),
+                    stralign="center",
+                )
+            )
+        if player == "black":
+            print(
+                tabulate(
+                    table["black"],
+                    headers=list(reversed(self.columns)),
+                    showindex=list(range(1, 9)),
+                    stralign="center",
+                )
+            )
+
+    # Assumes current_pos and end_pos are in the right format.
+    # Checks to see if moving from current_pos to end_pos is a legal move
+    # for player 'color' to make (excluding castling and ignoring check restrictions).
+    def is_legal(self, current_pos, end_pos, color):
+        start = square(current_pos)
+        end = square(end_pos)
+        if self.position.occupied_co[COLORS.index(color)] & (1 << end):
+            return False
+        return bool(self.position.targets(start) & (1 << end))
+
+    # Again assumes current_pos and end_pos are in the right format.
+    # Determines if the given move will put player 'color' in check.
+    # If so, gives the row and column of the first piece found that will create check.
+    def is_threat(self, current_pos, end_pos, color):
+        position = self.position
+        start = square(current_pos)
+        end = square(end_pos)
+        us = COLORS.index(color)
+        them = us ^ 1
+        en_passant = (
+            end == position.ep_square
+            and position.pieces[us][PAWN] & (1 << start)
+            and (start - end) & 7
+        )
+        # Moves of the player's own pieces are settled by the checking and
+        # pinned pieces, which the position works out once and keeps.
+        if (
+            start != end
+            and position.occupied_co[us] & (1 << start)
+            and not position.occupied_co[us] & (1 << end)
+            and position.is_legal(position.build_move(start, end))
+        ):
+            return False, -1, -1
+        king = position.king(us)
+        if king == start:
+            king = end
+        # Otherwise work out the occupancy after the move instead of making
+        # it, then recheck every piece that could take the king.
+        occupied = (position.occupied & ~(1 << start)) | (1 << end)
+        enemies = position.occupied_co[them] & ~(1 << end)
+        if en_passant:
+            captured = end - 8 if us == WHITE else end + 8
+            occupied &= ~(1 << captured)
+            enemies &= ~(1 << captured)
+        attackers = position.attackers(them, king, occupied) & enemies
+        if attackers:
+            column, row = square_position((attackers & -attackers).bit_length() - 1)
+            return True, row, column
+        return False, -1, -1
+
+    # Again assumes current_pos and end_pos are in the right format.
+    # Determines if the given move is a valid castle.
+    def is_legal_castle(self, current_pos, end_pos, color):
+        position = self.position
+        start = square(current_pos)
+        end = square(end_pos)
+        us = COLORS.index(color)
+        home = 4 if us == WHITE else 60
+        if start != home or end not in (home - 2, home + 2):
+            return False
+        if not position.pieces[us][KING] & (1 << home):
+            return False
+        if end > home:
+            right = WHITE_KINGSIDE if us == WHITE else BLACK_KINGSIDE
+            rook = home + 3
+            between = [home + 1, home + 2]
+            crossed = between
+        else:
+            right = WHITE_QUEENSIDE if us == WHITE else BLACK_QUEENSIDE
+            rook = home - 4
+            between = [home - 1, home - 2, home - 3]
+            crossed = [home - 1, home - 2]
+        if not position.castling & right:
+            return False
+        if not position.pieces[us][ROOK] & (1 << rook):
+            return False
+        if any(position.occupied & (1 << sq) for sq in between):
+            return False
+        # The king may not castle out of, through or into check.
+        return not any(
+            position.is_attacked(us ^ 1, sq) for sq in [home] + crossed
+        )
+
+    # Checks that 'text' names a square, e.g. 'c3', and returns it in
+    # the ('c', 3) format. Returns None otherwise.
+    def _parse_square(self, text):
+        if (
+            isinstance(text, str)
+            and len(text) == 2
+            and text[0] in self.columns
+            and text[1] in "12345678"
+        ):
+            return (text[0], int(text[1]))
+        return None
+
+    # Returns the legal 'Move' that takes the piece on current_pos to end_pos
+    # for the side to move, or None if there is no such move. 'promotion' is
+    # only used when a pawn reaches the last row. The move is looked up among
+    # those generate_legal gives, so both always agree on what is legal.
+    def find_move(self, current_pos, end_pos, promotion="queen"):
+        position = self.position
+        start = square(current_pos)
+        end = square(end_pos)
+        if not position.occupied_co[position.turn] & (1 << start):
+            return None
+        promotion = PIECES.index(promotion)
+        for move in generate_legal(position):
+            if (
+                move.start == start
+                and move.end == end
+                and move.promotion in (None, promotion)
+            ):
+                return move
+        return None
+
+    # Moves a piece from current_pos to end_pos without any checks.
+    # 'promotion' is the piece a pawn reaching the last row becomes.
+    def _execute(self, current_pos, end_pos, promotion="queen"):
+        start = square(current_pos)
+        end = square(end_pos)
+        self.make_move(self.position.build_move(start, end, PIECES.index(promotion)))
+
+    # Plays 'move', a 'Move' from legal_moves, without asking for input or
+    # printing anything. Keeps the turn count, the fifty move counter and the
+    # repetition counts up to date. Only what cannot be worked out again from
+    # the move is saved, so that unmake_move can take it back without copying
+    # the board.
+    def make_move(self, move):
+        position = self.position
+        self._undo.append(
+            _pack_undo(
+                move,
+                position.castling,
+                position.ep_square,
+                self.turn_count - self.fifty,
+            )
+        )
+        self._undo.append(position.hash)
+        position.play(move)
+        # Keeping track of game progress for the fifty move rule
+        if move.captured is not None or move.piece == PAWN:
+            self.fifty = self.turn_count
+            self.repetitions = {}
+        self.repetitions[position.hash] = self.repetitions.get(position.hash, 0) + 1
+        self.turn_count += 1
+        self._squares = None
+
+    # Takes back the last move played with make_move and returns it.
+    def unmake_move(self):
+        key = self._undo.pop()
+        entry = self._undo.pop()
+        move = _unpack_move(entry)
+        position = self.position
+        if move.captured is not None or move.piece == PAWN:
+            self._count_repetitions(key)
+        else:
+            count = self.repetitions[position.hash] - 1
+            if count:
+                self.repetitions[position.hash] = count
+            else:
+                del self.repetitions[position.hash]
+        ep = entry >> 27 & 127
+        position.undo(move, entry >> 23 & 15, ep - 1 if ep else None, key)
+        self.turn_count -= 1
+        self.fifty = self.turn_count - (entry >> 34)
+        self._squares = None
+        return move
+
+    # Counts the positions again after a capture or pawn move was taken back,
+    # from the one with hash 'key' back to the last capture or pawn move
+    # before it, instead of keeping the counts of every earlier stretch.
+    def _count_repetitions(self, key):
+        repetitions = {key: 1}
+        for index in range(len(self._undo) - 2, -1, -2):
+            move = _unpack_move(self._undo[index])
+            if move.captured is not None or move.piece == PAWN:
+                break
+            earlier = self._undo[index + 1]
+            repetitions[earlier] = repetitions.get(earlier, 0) + 1
+        self.repetitions = repetitions
+
+    # The moves played so far with make_move (or move_piece), oldest first.
+    @property
+    def move_stack(self):
+        return [_unpack_move(entry) for entry in self._undo[::2]]
+
+    # Every move played so far by the turn it was played on, as the name of
+    # the piece and its start and end squares in the ('e', 2) format.
+    @property
+    def history(self):
+        history = {}
+        turn = self.turn_count - len(self._undo) // 2
+        for move in self.move_stack:
+            history[turn] = (
+                PIECES[move.piece],
+                square_position(move.start),
+                square_position(move.end),
+            )
+            turn += 1
+        return history
+
+    # First asks user to input a square to move from.
+    # Checks to see if the input is in the correct format and that the
+    # selected square contains a piece belonging to 'color'.
+    # Then asks user to input a square to move to, and uses the above
+    # functions to determine if it is a legal move.
+    # If it is, the function moves the piece, if not, it asks for another input.
+    # The 'color' argument determines which player is moving a piece.
+    def move_piece(self, color):
+        while True:
+            while True:
+                current_pos = input(
+                    "What piece would you ("
+                    + str(color)
+                    + ") like to move? Type 'help' for assistance.\nInput:"
+                )
+                if current_pos == "help":
+                    print(
+                        "To make a move, type the column letter followed by the row number\n"
+                        + "of the piece you would like to move.\n"
+                        + "Another query will follow asking you where you would\n"
+                        + "like to move that piece. Example: 'c3'."
+                    )
+                    continue
+                current_pos = self._parse_square(current_pos)
+                if current_pos and color == self.squares[current_pos]["player"]:
+                    print("Input received.")
+                    break
+
+                print(
+                    "You either typed something that wasn't a square, that square is\n"
+                    + "unoccupied, or you do not own that piece."
+                )
+                self.visualize(color)
+                continue
+            while True:
+                end_pos = input(
+                    "Where would you like to move your "
+                    + str(self.squares[current_pos]["occupied"])
+                    + " (currently at "
+                    + current_pos[0]
+                    + str(current_pos[1])
+                    + ") to?\nInput:"
+                )
+                if end_pos == "help":
+                    print(
+                        "To finish making a move, type the column letter followed by the row\n"
+                        + "number of the square you would like to move the piece to.\n"
+                        + "Example: 'c3'. If you want to select a different piece, type 'back'."
+                    )
+                    continue
+                if end_pos == "back":
+                    break
+                end_pos = self._parse_square(end_pos)
+                if not end_pos:
+                    print("You typed something that wasn't a valid square.")
+                    self.visualize(color)
+                    continue
+                if not self.is_legal(
+                    current_pos, end_pos, color
+                ) and not self.is_legal_castle(current_pos, end_pos, color):
+                    print("That is not a legal move.")
+                    self.visualize(color)
+                break
+
+            if end_pos == "back":
+                continue
+            if self.is_legal(current_pos, end_pos, color):
+                is_threat_temp = self.is_threat(current_pos, end_pos, color)
+                if is_threat_temp[0]:
+                    i = is_threat_temp[1]
+                    j = is_threat_temp[2]
+                    print(
+                        "That move would place "
+                        + str(color)
+                        + " in check from "
+                        + str(self.squares[(j, i)]["occupied"])
+                        + " at "
+                        + str(j)
+                        + str(i)
+                        + "."
+                    )
+                    continue
+                promo = "queen"
+                piece = self.squares[current_pos]["occupied"]
+                if piece == "pawn" and end_pos[1] in [1, 8]:
+                    while True:
+                        promo = input(
+                            "What piece would you like to promote your pawn to? Type\n"
+                            "queen, rook, knight, or bishop."
+                        )
+                        if promo not in ["queen", "rook", "knight", "bishop"]:
+                            print("Invalid selection. Try again.")
+                            continue
+                        break
+                self._execute(current_pos, end_pos, promo)
+            elif self.is_legal_castle(current_pos, end_pos, color):
+                self._execute(current_pos, end_pos)
+            else:
+                continue
+            print("Move completed.")
+            if color == "white":
+                self.visualize(player="black")
+            else:
+                self.visualize(player="white")
+            break
+
+    # Returns a list of every legal move for player 'color' ("white" or
+    # "black"), or for the side to move if no color is given. Each entry is
+    # a 'Move' (see movegen.py) with the start and end squares as indices
+    # from 0 (a1) to 63 (h8), the moving and captured pieces and, where they
+    # apply, the promotion piece and whether it is a castle or en passant.
+    def legal_moves(self, color=None):
+        if color is not None:
+            color = COLORS.index(color)
+        return legal_moves(self.position, color)
+
+    # Counts the positions reached after 'depth' moves from the current one.
+    # Used to check the move rules against known totals (see perft.py).
+    def perft(self, depth):
+        return perft(self.position, depth)
+
+    # Number of times the current position has occurred in this game.
+    def repetition_count(self):
+        return self.repetitions.get(self.position.hash, 0)
+
+    # A player may claim a draw once the same position has occurred three
+    # times. At five times the game is drawn without a claim (see end).
+    def can_claim_repetition(self):
+        return self.repetition_count() >= 3
+
+    # The state of the game for 'color' (the side to move by default):
+    # "checkmate" or "stalemate" when it has no legal moves, otherwise
+    # "fifty-move" once fifty moves have passed for both players without a
+    # capture or pawn move, "repetition" when the position has occurred for
+    # the fifth time, "insufficient material" when neither side can mate,
+    # or "ongoing". Only the first legal move is generated, and the king
+    # moves, which settle most positions, are generated first.
+    def status(self, color=None):
+        position = self.position
+        us = position.turn if color is None else COLORS.index(color)
+        if next(generate_legal(position, us), None) is None:
+            return "checkmate" if position.checkers(us) else "stalemate"
+        if self.turn_count - self.fifty >= 101:
+            return "fifty-move"
+        if self.repetition_count() >= 5:
+            return "repetition"
+        if position.insufficient_material():
+            return "insufficient material"
+        return "ongoing"
+
+    # Checks for game end conditions, checkmate or stalemate either
+    # due to unavailability of legal moves w/o check or fifty moves
+    # have passed for both players without a captured piece or pawn moved.
+    # A position occurring for the fifth time ends the game as "repetition".
+    # The fifty move rule comes from tournament chess, despite some
+    # conditions existing where more than fifty moves are needed to
+    # force checkmate. Positions where neither side can mate also count as
+    # "stalemate".
+    def end(self, color):  # See if 'color' wins the game.
+        status = self.status(COLORS[COLORS.index(color) ^ 1])
+        if status in ("checkmate", "stalemate", "repetition"):
+            return status
+        if status == "ongoing":
+            return False
+        return "stalemate"
+
+
+if __name__ == "__main__":
+    x = Game()
+
+    def claim_draw():
+        answer = input(
+            "This position has occurred three times. Would you like to claim\n"
+            + "a draw? Type 'yes' to claim it.\nInput:"
+        )
+        return answer == "yes"
+
+    try:
+        x.visualize(player="white")
+        while True:
+            x.move_piece("white")
+            end = x.end("white")
+            if end == "checkmate":
+                print("White wins the game!")
+                break
+            if end == "stalemate":
+                print("The game is a draw.")
+                break
+            if end == "repetition":
+                print("The position has occurred five times. The game is a draw.")
+                break
+            if x.can_claim_repetition() and claim_draw():
+                print("The game is a draw.")
+                break
+            black_threat = x.is_threat(x.black_king, x.black_king, "black")
+            if black_threat[0]:
+                print(
+                    "Black is in check from "
+                    + str(
+                        x.squares[(black_threat[2], black_threat[1])]["occupied"]
+                        + " located at "
+                        + str(black_threat[2])
+                        + str(black_threat[1])
+                        + "."
+                    )
+                )
+            x.move_piece("black")
+            end = x.end("black")
+            if end == "checkmate":
+                print("Black wins the game!")
+                break
+            if end == "stalemate":
+                print("The game is a draw.")
+                break
+            if end == "repetition":
+                print("The position has occurred five times. The game is a draw.")
+                break
+            if x.can_claim_repetition() and claim_draw():
+                print("The game is a draw.")
+                break
+            white_threat = x.is_threat(x.white_king, x.white_king, "white")
+            if white_threat[0]:
+                print(
+                    "White is in check from "
+                    + str(
+                        x.squares[(white_threat[2], white_threat[1])]["occupied"]
+                        + " located at "
+                        + str(white_threat[2])
+                        + str(white_threat[1])
+                        + "."
+                    )
+                )
+        for key in x.history:
+            print(str(key) + ": " + str(x.history[key]))
+    except KeyboardInterrupt:
+        print("\n \nYou flipped the table!!!")
+        for key in x.history:
+            print(str(key) + ": " + str(x.history[key]))
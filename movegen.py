@@ -0,0 +1,173 @@
+from bitboard import (
+    BETWEEN,
+    BISHOP,
+    BLACK_KINGSIDE,
+    BLACK_QUEENSIDE,
+    CASTLE,
+    DOUBLE_PUSH,
+    EN_PASSANT,
+    FULL,
+    KING,
+    KNIGHT,
+    NORMAL,
+    PAWN,
+    QUEEN,
+    ROOK,
+    WHITE,
+    WHITE_KINGSIDE,
+    WHITE_QUEENSIDE,
+    Move,
+    bishop_attacks,
+    king_attacks,
+    knight_attacks,
+    pawn_attacks,
+    queen_attacks,
+    rook_attacks,
+    scan,
+)
+
+#  This file generates the legal moves of a bitboard 'Position'.
+#  Targets are first worked out per piece as if check did not matter, then
+#  narrowed down with a check mask (the squares that stop a check) and a pin
+#  mask for each pinned piece (the line between its king and the pinner).
+
+PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+
+# Yields every legal move for 'color' (the side to move by default).
+def generate_legal(position, color=None):
+    if color is None:
+        color = position.turn
+    them = color ^ 1
+    pieces = position.pieces[color]
+    enemy_pieces = position.pieces[them]
+    board = position.board
+    own = position.occupied_co[color]
+    enemy = position.occupied_co[them]
+    occupied = position.occupied
+    king = position.king(color)
+
+    # The king may go anywhere the other side does not attack. A slider
+    # giving check also covers the squares behind the king, which the
+    # attack maps cannot see while the king itself blocks the line.
+    checkers = position.checkers(color)
+    targets = king_attacks(king) & ~own & ~position.attacked_by(them)
+    if checkers:
+        without_king = occupied ^ (1 << king)
+        bishops = enemy_pieces[BISHOP] | enemy_pieces[QUEEN]
+        rooks = enemy_pieces[ROOK] | enemy_pieces[QUEEN]
+        for checker in scan(checkers & bishops):
+            targets &= ~bishop_attacks(checker, without_king)
+        for checker in scan(checkers & rooks):
+            targets &= ~rook_attacks(checker, without_king)
+    for end in scan(targets):
+        captured = board[end] & 7 if enemy & (1 << end) else None
+        yield Move(king, end, KING, captured, None, NORMAL)
+
+    if checkers & (checkers - 1):
+        return  # Only the king can get out of a double check.
+    if checkers:
+        check_mask = checkers | BETWEEN[king][checkers.bit_length() - 1]
+    else:
+        check_mask = FULL
+        yield from _castling(position, color, king)
+
+    pinned = position.pins(color)
+    targets_mask = ~own & check_mask
+
+    for piece, attacks in (
+        (KNIGHT, None),
+        (BISHOP, bishop_attacks),
+        (ROOK, rook_attacks),
+        (QUEEN, queen_attacks),
+    ):
+        for start in scan(pieces[piece]):
+            if piece == KNIGHT:
+                targets = knight_attacks(start) & targets_mask
+            else:
+                targets = attacks(start, occupied) & targets_mask
+            if start in pinned:
+                targets &= pinned[start]
+            for end in scan(targets):
+                captured = board[end] & 7 if enemy & (1 << end) else None
+                yield Move(start, end, piece, captured, None, NORMAL)
+
+    yield from _pawn_moves(position, color, check_mask, pinned)
+
+
+def _pawn_moves(position, color, check_mask, pinned):
+    board = position.board
+    enemy = position.occupied_co[color ^ 1]
+    empty = ~position.occupied
+    forward = 8 if color == WHITE else -8
+    start_rank = 1 if color == WHITE else 6
+    last_rank = 7 if color == WHITE else 0
+    ep_square = position.ep_square
+    if ep_square is not None and (ep_square >> 3) != (5 if color == WHITE else 2):
+        ep_square = None
+
+    for start in scan(position.pieces[color][PAWN]):
+        allowed = check_mask & pinned.get(start, FULL)
+        one = start + forward
+        targets = 0
+        if empty & (1 << one):
+            targets |= 1 << one
+            two = one + forward
+            if (start >> 3) == start_rank and empty & (1 << two):
+                targets |= 1 << two
+        targets |= pawn_attacks(color, start) & enemy
+        for end in scan(targets & allowed):
+            captured = board[end] & 7 if enemy & (1 << end) else None
+            if (end >> 3) == last_rank:
+                for promotion in PROMOTIONS:
+                    yield Move(start, end, PAWN, captured, promotion, NORMAL)
+            elif end - start == 2 * forward:
+                yield Move(start, end, PAWN, None, None, DOUBLE_PUSH)
+            else:
+                yield Move(start, end, PAWN, captured, None, NORMAL)
+        if ep_square is not None and pawn_attacks(color, start) & (1 << ep_square):
+            # En passant removes two pawns from the same row at once, which
+            # neither mask describes, so it is checked on its own.
+            move = Move(start, ep_square, PAWN, PAWN, None, EN_PASSANT)
+            if position.is_legal(move):
+                yield move
+
+
+def _castling(position, color, king):
+    if color == WHITE:
+        rights = ((WHITE_KINGSIDE, 4, 7), (WHITE_QUEENSIDE, 4, 0))
+    else:
+        rights = ((BLACK_KINGSIDE, 60, 63), (BLACK_QUEENSIDE, 60, 56))
+    them = color ^ 1
+    for right, home, corner in rights:
+        if not position.castling & right or king != home:
+            continue
+        if not position.pieces[color][ROOK] & (1 << corner):
+            continue
+        step = 1 if corner > home else -1
+        path = range(home + step, corner, step)
+        if any(position.occupied & (1 << sq) for sq in path):
+            continue
+        crossed = (1 << (home + step)) | (1 << (home + 2 * step))
+        if position.attacked_by(them) & crossed:
+            continue
+        yield Move(home, home + 2 * step, KING, None, None, CASTLE)
+
+
+def legal_moves(position, color=None):
+    return list(generate_legal(position, color))
+
+
+# Counts the leaf nodes of the legal move tree 'depth' plies deep.
+def perft(position, depth):
+    if depth <= 1:
+        return len(legal_moves(position)) if depth == 1 else 1
+    nodes = 0
+    castling = position.castling
+    ep_square = position.ep_square
+    key = position.hash
+    for move in legal_moves(position):
+        position.play(move)
+        nodes += perft(position, depth - 1)
+        position.undo(move, castling, ep_square, key)
+    return nodes
@@ -0,0 +1,144 @@
+import argparse
+import multiprocessing
+import time
+from collections import namedtuple
+
+from encoding import decode, encode
+from game import Game
+from search import MATE_BOUND, Searcher
+from transposition import DEFAULT_SIZE_MB, TranspositionTable
+
+#  This file spreads perft and analysis over several processes. The legal
+#  moves at the root are handed out to a pool of workers, one move per task,
+#  and the results are merged when they come back. A 'Game' is never sent
+#  between processes: each task carries the 32 byte record (see
+#  encoding.py) of the position after its root move, and the worker sets up
+#  its own 'Game' from that.
+
+# 'move' is the root move, 'score' its value in centipawns for the side to
+# move at the root, 'depth' the depth searched counting the root move, 'pv'
+# the expected line starting with 'move' and 'nodes' the positions searched.
+AnalysisLine = namedtuple("AnalysisLine", ["move", "score", "depth", "pv", "nodes"])
+
+_table = None  # the transposition table of a worker process
+
+
+def _start_worker(table_mb):
+    global _table
+    _table = TranspositionTable(table_mb)
+
+
+def _perft_task(task):
+    index, record, depth = task
+    return index, decode(record).perft(depth)
+
+
+def _search_task(task):
+    index, record, keys, depth, time_limit = task
+    game = decode(record)
+    for key in keys:
+        game.repetitions[key] = game.repetitions.get(key, 0) + 1
+    return index, Searcher(game, _table).search(depth, time_limit)
+
+
+# The record of the position after each legal move of 'game', in the order
+# of its legal moves.
+def _children(game):
+    moves = game.legal_moves()
+    records = []
+    for move in moves:
+        game.make_move(move)
+        records.append(encode(game))
+        game.unmake_move()
+    return moves, records
+
+
+# Counts the leaf nodes 'depth' plies below 'game' using 'processes' worker
+# processes (one per core by default). Returns the total and a dictionary
+# from each root move to the count below it.
+def parallel_perft(game, depth, processes=None):
+    if depth <= 1:
+        moves = game.legal_moves()
+        return (len(moves), {move: 1 for move in moves}) if depth == 1 else (1, {})
+    moves, records = _children(game)
+    tasks = [(index, record, depth - 1) for index, record in enumerate(records)]
+    counts = {}
+    with multiprocessing.Pool(processes) as pool:
+        for index, nodes in pool.imap_unordered(_perft_task, tasks):
+            counts[moves[index]] = nodes
+    divide = {move: counts[move] for move in moves}
+    return sum(divide.values()), divide
+
+
+# Searches every root move of 'game' to 'depth' plies in parallel and
+# returns an AnalysisLine for each, best first. 'multipv' keeps only that
+# many lines. 'time_limit' applies to each root move separately and
+# 'table_mb' is the size of each worker's transposition table.
+def analyse(
+    game,
+    depth,
+    multipv=None,
+    processes=None,
+    time_limit=None,
+    table_mb=DEFAULT_SIZE_MB,
+):
+    moves, records = _children(game)
+    keys = tuple(
+        key for key, count in game.repetitions.items() for repeat in range(count)
+    )
+    tasks = [
+        (index, record, keys, depth - 1, time_limit)
+        for index, record in enumerate(records)
+    ]
+    lines = []
+    with multiprocessing.Pool(processes, _start_worker, (table_mb,)) as pool:
+        for index, result in pool.imap_unordered(_search_task, tasks):
+            score = -result.score
+            if score > MATE_BOUND:
+                score -= 1  # Mate is one ply further away from the root.
+            elif score < -MATE_BOUND:
+                score += 1
+            lines.append(
+                AnalysisLine(
+                    moves[index],
+                    score,
+                    result.depth + 1,
+                    [moves[index]] + result.pv,
+                    result.nodes,
+                )
+            )
+    lines.sort(key=lambda line: -line.score)
+    return lines if multipv is None else lines[:multipv]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run perft or analysis on several cores at once."
+    )
+    parser.add_argument("--fen", help="position to start from (default: start)")
+    parser.add_argument("--depth", type=int, default=4, help="depth in plies")
+    parser.add_argument("--processes", type=int, help="worker processes to use")
+    parser.add_argument(
+        "--analyse", action="store_true", help="search instead of counting"
+    )
+    parser.add_argument("--multipv", type=int, help="number of lines to show")
+    args = parser.parse_args()
+
+    game = Game.from_fen(args.fen) if args.fen else Game()
+    started = time.perf_counter()
+    if args.analyse:
+        for line in analyse(game, args.depth, args.multipv, args.processes):
+            print(
+                str(line.score)
+                + " "
+                + " ".join(str(move) for move in line.pv)
+                + " ("
+                + str(line.nodes)
+                + " nodes)"
+            )
+    else:
+        total, divide = parallel_perft(game, args.depth, args.processes)
+        for move, nodes in divide.items():
+            print(str(move) + ": " + str(nodes))
+        print("\n" + str(total) + " nodes")
+    print(str(round(time.perf_counter() - started, 3)) + " seconds.")
@@ -0,0 +1,157 @@
+import argparse
+import time
+
+from tabulate import tabulate
+
+from game import Game
+
+#  This file runs perft (performance test) on a set of standard positions.
+#  Perft counts every position reachable in a given number of moves, so
+#  comparing against the well known totals checks the move rules, including
+#  castling, en passant and promotion, and timing it gives a benchmark.
+#  Run it with 'python perft.py --depth 3'.
+
+# Name, FEN and the expected node counts for depth 1, 2, 3, ...
+POSITIONS = [
+    (
+        "start position",
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        [20, 400, 8902, 197281, 4865609],
+    ),
+    (
+        "Kiwipete",
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        [48, 2039, 97862, 4085603],
+    ),
+    (
+        "position 3",
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        [14, 191, 2812, 43238, 674624],
+    ),
+    (
+        "position 4",
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        [6, 264, 9467, 422333],
+    ),
+    (
+        "position 5",
+        "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        [44, 1486, 62379, 2103487],
+    ),
+    (
+        "en passant discovers check",
+        "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+        [15, 126, 1928, 13931],
+    ),
+    (
+        "en passant pinned along row",
+        "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+        [18, 92, 1670, 10138],
+    ),
+    (
+        "en passant into check",
+        "8/5bk1/8/2Pp4/8/1K6/8/8 w - d6 0 1",
+        [8, 104, 736, 9287],
+    ),
+    (
+        "promotion out of check",
+        "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+        [11, 133, 1442, 19174],
+    ),
+    (
+        "promotion gives check",
+        "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+        [9, 40, 472, 2661],
+    ),
+    (
+        "under-promotion",
+        "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+        [6, 27, 273, 1329],
+    ),
+    (
+        "promotion with captures",
+        "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1",
+        [24, 496, 9483, 182838],
+    ),
+    (
+        "castling through attacks",
+        "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+        [26, 1141, 27826, 1274206],
+    ),
+    (
+        "castling blocked by checks",
+        "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+        [44, 1494, 50509, 1720476],
+    ),
+]
+
+
+# Runs every position up to 'max_depth' (or as deep as its expected counts
+# go) and returns a list of rows plus the number of mismatches.
+def run(max_depth, names=None):
+    rows = []
+    failures = 0
+    for name, fen, expected in POSITIONS:
+        if names and name not in names:
+            continue
+        for depth in range(1, min(max_depth, len(expected)) + 1):
+            game = Game.from_fen(fen)
+            started = time.perf_counter()
+            nodes = game.perft(depth)
+            elapsed = time.perf_counter() - started
+            ok = nodes == expected[depth - 1]
+            if not ok:
+                failures += 1
+            rows.append(
+                [
+                    name,
+                    depth,
+                    nodes,
+                    expected[depth - 1],
+                    "ok" if ok else "FAIL",
+                    elapsed,
+                    int(nodes / elapsed) if elapsed else 0,
+                ]
+            )
+    return rows, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run perft on standard positions.")
+    parser.add_argument("--depth", type=int, default=3, help="deepest ply to count")
+    parser.add_argument(
+        "--position",
+        action="append",
+        help="only run the named position (may be repeated)",
+    )
+    args = parser.parse_args()
+
+    rows, failures = run(args.depth, args.position)
+    print(
+        tabulate(
+            rows,
+            headers=[
+                "position",
+                "depth",
+                "nodes",
+                "expected",
+                "",
+                "seconds",
+                "nodes/s",
+            ],
+            floatfmt=".3f",
+        )
+    )
+    total_nodes = sum(row[2] for row in rows)
+    total_time = sum(row[5] for row in rows)
+    print(
+        "\n"
+        + str(total_nodes)
+        + " nodes in "
+        + str(round(total_time, 3))
+        + " seconds, "
+        + str(failures)
+        + " mismatches."
+    )
+    if failures:
+        raise SystemExit(1)
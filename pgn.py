@@ -0,0 +1,295 @@
+import re
+import sys
+import time
+from collections import namedtuple
+
+from bitboard import (
+    COLORS,
+    KING,
+    PAWN,
+    WHITE,
+    square,
+    square_name,
+)
+from game import Game
+from movegen import generate_legal
+from replay import ReplayResult
+
+#  This file reads and writes games in PGN (Portable Game Notation).
+#  The reader works through a file one line at a time and yields each game
+#  as soon as its result is reached, so only one game is held in memory no
+#  matter how large the file is. The writer turns the moves of a 'Game' into
+#  standard algebraic notation (SAN) and writes them out as it goes.
+
+# 'headers' is a dictionary of the tag pairs, 'moves' the list of SAN moves
+# of the main line (comments, variations and annotations are dropped) and
+# 'result' the game termination marker ("1-0", "0-1", "1/2-1/2" or "*").
+PgnGame = namedtuple("PgnGame", ["headers", "moves", "result"])
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+DEFAULT_TAGS = {"Date": "????.??.??"}
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+PIECE_LETTERS = "PNBRQK"
+
+_TAG = re.compile(r'^\[\s*([A-Za-z0-9_]+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_TOKEN = re.compile(r"[{}();]|\$\d+|[^\s{}();]+")
+_MOVE_NUMBER = re.compile(r"^\d+(?:\.+|$)")  # "12.", "12..." or a bare "12"
+_SAN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+
+# Yields a PgnGame for every game in 'stream', an open text file or any
+# other iterable of lines.
+def read_games(stream):
+    headers = {}
+    moves = []
+    in_comment = False
+    depth = 0  # how many variations deep the reader currently is
+    for line in stream:
+        if not in_comment:
+            stripped = line.strip()
+            if stripped.startswith("%"):
+                continue
+            if depth == 0 and stripped.startswith("["):
+                match = _TAG.match(stripped)
+                if match:
+                    if moves:
+                        # A game without a result marker ends at the next tags.
+                        yield PgnGame(headers, moves, headers.get("Result", "*"))
+                        headers = {}
+                        moves = []
+                    value = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                    headers[match.group(1)] = value
+                    continue
+        for token in _TOKEN.findall(line):
+            if in_comment:
+                if token == "}":
+                    in_comment = False
+                continue
+            if token == "{":
+                in_comment = True
+            elif token == ";":
+                break
+            elif token == "(":
+                depth += 1
+            elif token == ")":
+                depth = max(depth - 1, 0)
+            elif depth or token.startswith("$"):
+                continue
+            elif token in RESULTS:
+                yield PgnGame(headers, moves, token)
+                headers = {}
+                moves = []
+            else:
+                token = _MOVE_NUMBER.sub("", token)
+                if token:
+                    moves.append(token)
+    if moves or headers:
+        yield PgnGame(headers, moves, headers.get("Result", "*"))
+
+
+# Finds the legal Move of 'game' written as 'text' in SAN, or returns None if
+# it is not a legal move or is ambiguous. 'moves' can pass in the legal
+# moves of the position when they are already known.
+def parse_san(game, text, moves=None):
+    text = text.rstrip("+#!?")
+    position = game.position
+    if moves is None:
+        moves = generate_legal(position)
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        home = 4 if position.turn == WHITE else 60
+        end = home + 2 if len(text) == 3 else home - 2
+        for move in moves:
+            if move.is_castle and move.end == end:
+                return move
+        return None
+    match = _SAN.match(text)
+    if not match:
+        return None
+    letter, column, row, destination, promotion = match.groups()
+    piece = PIECE_LETTERS.index(letter) if letter else PAWN
+    end = square(destination)
+    if promotion is not None:
+        promotion = PIECE_LETTERS.index(promotion)
+    found = None
+    for move in moves:
+        if move.end != end or move.piece != piece:
+            continue
+        if column and "abcdefgh"[move.start & 7] != column:
+            continue
+        if row and str((move.start >> 3) + 1) != row:
+            continue
+        if move.promotion != promotion:
+            continue
+        if found is not None:
+            return None
+        found = move
+    return found
+
+
+# Writes 'move', which must be legal in 'game', in SAN.
+def san(game, move):
+    position = game.position
+    if move.is_castle:
+        text = "O-O" if move.end > move.start else "O-O-O"
+    else:
+        text = ""
+        if move.piece == PAWN:
+            if move.is_capture:
+                text = "abcdefgh"[move.start & 7]
+        else:
+            text = PIECE_LETTERS[move.piece]
+            if move.piece != KING:
+                text += _disambiguation(position, move)
+        if move.is_capture:
+            text += "x"
+        text += square_name(move.end)
+        if move.promotion is not None:
+            text += "=" + PIECE_LETTERS[move.promotion]
+    game.make_move(move)
+    if position.checkers(position.turn):
+        text += "+" if next(generate_legal(position), None) else "#"
+    game.unmake_move()
+    return text
+
+
+# The start column, row or square needed to tell 'move' apart from other
+# pieces of the same kind that could also move to its end square.
+def _disambiguation(position, move):
+    others = [
+        other.start
+        for other in generate_legal(position)
+        if other.piece == move.piece
+        and other.end == move.end
+        and other.start != move.start
+    ]
+    if not others:
+        return ""
+    name = square_name(move.start)
+    if all((other & 7) != (move.start & 7) for other in others):
+        return name[0]
+    if all((other >> 3) != (move.start >> 3) for other in others):
+        return name[1]
+    return name
+
+
+# Plays a PgnGame through the rules and returns a ReplayResult (see
+# replay.py), stopping at the first move that is not legal. Games with a
+# FEN tag start from that position.
+def replay_pgn(pgn_game, game=None):
+    if game is None:
+        if "FEN" in pgn_game.headers:
+            game = Game.from_fen(pgn_game.headers["FEN"])
+        else:
+            game = Game()
+    plies = 0
+    for text in pgn_game.moves:
+        move = parse_san(game, text)
+        if move is None:
+            return ReplayResult(game, plies, (plies, text), False)
+        game.make_move(move)
+        plies += 1
+    status = game.end(COLORS[game.position.turn ^ 1])
+    return ReplayResult(game, plies, None, status)
+
+
+# The PGN result of 'game' based on Game.end, or "*" while it is undecided.
+def game_result(game):
+    mover = game.position.turn ^ 1
+    status = game.end(COLORS[mover])
+    if status == "checkmate":
+        return "1-0" if mover == WHITE else "0-1"
+    if status:
+        return "1/2-1/2"
+    return "*"
+
+
+class PgnWriter:
+    # 'stream' is any object with a write method. Move text is wrapped so
+    # that lines are at most 'width' characters long.
+    def __init__(self, stream, width=80):
+        self.stream = stream
+        self.width = width
+        self._column = 0
+
+    # Writes 'game' as one PGN game. 'headers' can add to or override the
+    # tags; the Seven Tag Roster is always written, with "?" where unknown,
+    # and games that did not begin from the starting position get a FEN tag.
+    # The moves are taken back and replayed one at a time to work out their
+    # SAN, which leaves 'game' as it was found.
+    def write_game(self, game, headers=None):
+        tags = dict(headers or {})
+        tags.setdefault("Result", game_result(game))
+        moves = []
+        while game.move_stack:
+            moves.append(game.unmake_move())
+        moves.reverse()
+        fen = game.to_fen()
+        if fen != START_FEN:
+            tags.setdefault("SetUp", "1")
+            tags.setdefault("FEN", fen)
+        for name in SEVEN_TAG_ROSTER:
+            tags.setdefault(name, DEFAULT_TAGS.get(name, "?"))
+        for name in SEVEN_TAG_ROSTER + tuple(
+            name for name in tags if name not in SEVEN_TAG_ROSTER
+        ):
+            value = str(tags[name]).replace("\\", "\\\\").replace('"', '\\"')
+            self.stream.write("[" + name + ' "' + value + '"]\n')
+        self.stream.write("\n")
+
+        self._column = 0
+        for index, move in enumerate(moves):
+            if game.position.turn == WHITE:
+                self._write_token(str(game.turn_count // 2 + 1) + ".")
+            elif index == 0:
+                self._write_token(str(game.turn_count // 2) + "...")
+            self._write_token(san(game, move))
+            game.make_move(move)
+        self._write_token(tags["Result"])
+        self.stream.write("\n\n")
+
+    def _write_token(self, token):
+        if self._column and self._column + 1 + len(token) > self.width:
+            self.stream.write("\n")
+            self._column = 0
+        if self._column:
+            self.stream.write(" ")
+            self._column += 1
+        self.stream.write(token)
+        self._column += len(token)
+
+
+# Replays every game of a PGN file and reports the ones with illegal moves.
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python pgn.py PGN_FILE")
+        raise SystemExit(2)
+    started = time.perf_counter()
+    games = 0
+    plies = 0
+    with open(sys.argv[1]) as pgn_file:
+        for pgn_game in read_games(pgn_file):
+            games += 1
+            result = replay_pgn(pgn_game)
+            plies += result.plies
+            if result.illegal is not None:
+                index, text = result.illegal
+                print(
+                    "Game "
+                    + str(games)
+                    + ": move "
+                    + str(index + 1)
+                    + " ("
+                    + text
+                    + ") is not legal."
+                )
+    elapsed = time.perf_counter() - started
+    print(
+        str(games)
+        + " games ("
+        + str(plies)
+        + " moves) read in "
+        + str(round(elapsed, 3))
+        + " seconds."
+    )
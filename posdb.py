@@ -0,0 +1,232 @@
+import argparse
+import mmap
+import os
+import struct
+
+from encoding import RECORD_SIZE, decode, encode_into
+from game import Game
+from pgn import read_games, replay_pgn
+
+#  This file keeps a database of positions on disk. Every position added is
+#  appended to a data file as a 32 byte record (see encoding.py), together
+#  with the number of the game it came from and a link to the previous
+#  record of the same position. A second file holds an open addressing hash
+#  table from each position's Zobrist hash to its latest record and the
+#  number of times it was added. Both files are memory-mapped, so a lookup
+#  only touches the few pages it needs however large the database grows.
+
+_DATA_HEADER = struct.Struct("<8sQ")  # magic, number of entries
+_DATA_MAGIC = b"CHESSPOS"
+_LINK = struct.Struct("<II")  # game, previous entry; follows each record
+ENTRY_SIZE = RECORD_SIZE + _LINK.size  # 40
+
+_INDEX_HEADER = struct.Struct("<8sII")  # magic, number of slots, slots used
+_INDEX_MAGIC = b"CHESSIDX"
+_SLOT = struct.Struct("<QII")  # position key, latest entry, count
+SLOT_SIZE = _SLOT.size  # 16
+
+NO_ENTRY = 0xFFFFFFFF
+_INITIAL_ENTRIES = 4096
+_INITIAL_SLOTS = 4096  # Always a power of two.
+
+
+def _open_mapped(path, size, writable):
+    if writable:
+        if not os.path.exists(path):
+            with open(path, "wb") as new_file:
+                new_file.truncate(size)
+        handle = open(path, "r+b")
+        return handle, mmap.mmap(handle.fileno(), 0)
+    handle = open(path, "rb")
+    return handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class PositionDatabase:
+    # Opens the database at 'path' (the data file; the index is kept next to
+    # it in 'path' + ".idx"), creating it if it does not exist. With
+    # 'writable' False the files are only read, and must exist.
+    def __init__(self, path, writable=True):
+        self.path = path
+        self.writable = writable
+        created = not os.path.exists(path)
+        if created and not writable:
+            raise FileNotFoundError(path)
+        self._data_file, self._data = _open_mapped(
+            path, _DATA_HEADER.size + _INITIAL_ENTRIES * ENTRY_SIZE, writable
+        )
+        self._index_file, self._index = _open_mapped(
+            path + ".idx", _INDEX_HEADER.size + _INITIAL_SLOTS * SLOT_SIZE, writable
+        )
+        if created:
+            _DATA_HEADER.pack_into(self._data, 0, _DATA_MAGIC, 0)
+            _INDEX_HEADER.pack_into(self._index, 0, _INDEX_MAGIC, _INITIAL_SLOTS, 0)
+        magic, self._entries = _DATA_HEADER.unpack_from(self._data, 0)
+        if magic != _DATA_MAGIC:
+            raise ValueError("not a position database: " + repr(path))
+        magic, self._slots, self._used = _INDEX_HEADER.unpack_from(self._index, 0)
+        if magic != _INDEX_MAGIC:
+            raise ValueError("not a position index: " + repr(path + ".idx"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._entries
+
+    # True if the position of 'key' (a Game or a Zobrist hash) was ever added.
+    def __contains__(self, key):
+        return self.count(key) > 0
+
+    # How many times the position of 'key' (a Game or a Zobrist hash) was added.
+    def count(self, key):
+        slot = self._find(_key(key))
+        return _SLOT.unpack_from(self._index, slot)[2]
+
+    # Yields the number of every entry of the position of 'key', the latest
+    # first.
+    def entries(self, key):
+        slot = self._find(_key(key))
+        entry = _SLOT.unpack_from(self._index, slot)[1]
+        data = self._data
+        while entry != NO_ENTRY:
+            yield entry
+            offset = _DATA_HEADER.size + entry * ENTRY_SIZE + RECORD_SIZE
+            entry = _LINK.unpack_from(data, offset)[1]
+
+    # The number of the game entry 'entry' was added from.
+    def game_id(self, entry):
+        self._check(entry)
+        offset = _DATA_HEADER.size + entry * ENTRY_SIZE + RECORD_SIZE
+        return _LINK.unpack_from(self._data, offset)[0]
+
+    # The position of entry 'entry' as a new Game.
+    def get(self, entry):
+        self._check(entry)
+        return decode(self._data, _DATA_HEADER.size + entry * ENTRY_SIZE)
+
+    # Appends the current position of 'game' and returns its entry number.
+    # 'game_id' is stored with it, e.g. the game's number in an archive.
+    def add(self, game, game_id=0):
+        if not self.writable:
+            raise ValueError("the database was opened read-only")
+        entry = self._entries
+        if entry == NO_ENTRY:
+            raise ValueError("the database is full")
+        offset = _DATA_HEADER.size + entry * ENTRY_SIZE
+        if offset + ENTRY_SIZE > len(self._data):
+            self._data = self._grow(self._data_file, self._data, 2 * len(self._data))
+        if 2 * (self._used + 1) > self._slots:
+            self._rehash(2 * self._slots)
+
+        key = game.position.hash
+        slot = self._find(key)
+        stored, latest, count = _SLOT.unpack_from(self._index, slot)
+        if not count:
+            latest = NO_ENTRY
+            self._used += 1
+        encode_into(self._data, offset, game)
+        _LINK.pack_into(self._data, offset + RECORD_SIZE, game_id, latest)
+        _SLOT.pack_into(self._index, slot, key, entry, count + 1)
+        self._entries = entry + 1
+        _DATA_HEADER.pack_into(self._data, 0, _DATA_MAGIC, self._entries)
+        _INDEX_HEADER.pack_into(
+            self._index, 0, _INDEX_MAGIC, self._slots, self._used
+        )
+        return entry
+
+    # Adds every position 'game' went through, from its first position to
+    # its current one. The moves are taken back and replayed, which leaves
+    # 'game' as it was found. Returns the number of positions added.
+    def add_game(self, game, game_id=0):
+        moves = []
+        while game.move_stack:
+            moves.append(game.unmake_move())
+        self.add(game, game_id)
+        for move in reversed(moves):
+            game.make_move(move)
+            self.add(game, game_id)
+        return len(moves) + 1
+
+    # Writes any changes out to disk.
+    def flush(self):
+        if self.writable:
+            self._data.flush()
+            self._index.flush()
+
+    def close(self):
+        if self._data.closed:
+            return
+        self.flush()
+        self._data.close()
+        self._index.close()
+        self._data_file.close()
+        self._index_file.close()
+
+    def _check(self, entry):
+        if not 0 <= entry < self._entries:
+            raise IndexError("no entry " + str(entry))
+
+    # The offset of the slot holding 'key', or of the empty slot where it
+    # would go.
+    def _find(self, key):
+        index = self._index
+        mask = self._slots - 1
+        slot = key & mask
+        while True:
+            offset = _INDEX_HEADER.size + slot * SLOT_SIZE
+            stored, latest, count = _SLOT.unpack_from(index, offset)
+            if not count or stored == key:
+                return offset
+            slot = (slot + 1) & mask
+
+    def _grow(self, handle, mapped, size):
+        mapped.flush()
+        mapped.close()
+        handle.truncate(size)
+        return mmap.mmap(handle.fileno(), 0)
+
+    # Moves every key into a new table of 'slots' slots.
+    def _rehash(self, slots):
+        old = bytes(self._index[_INDEX_HEADER.size :])
+        self._index = self._grow(
+            self._index_file, self._index, _INDEX_HEADER.size + slots * SLOT_SIZE
+        )
+        self._index[_INDEX_HEADER.size :] = bytes(slots * SLOT_SIZE)
+        self._slots = slots
+        for offset in range(0, len(old), SLOT_SIZE):
+            key, latest, count = _SLOT.unpack_from(old, offset)
+            if count:
+                _SLOT.pack_into(self._index, self._find(key), key, latest, count)
+        _INDEX_HEADER.pack_into(self._index, 0, _INDEX_MAGIC, slots, self._used)
+
+
+def _key(key):
+    return key.position.hash if isinstance(key, Game) else key
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query a position database.")
+    parser.add_argument("database", help="path of the database file")
+    parser.add_argument("--add", metavar="PGN_FILE", help="add the games of a file")
+    parser.add_argument("--fen", help="look up a position")
+    args = parser.parse_args()
+
+    with PositionDatabase(args.database, writable=bool(args.add)) as database:
+        if args.add:
+            with open(args.add) as pgn_file:
+                for number, pgn_game in enumerate(read_games(pgn_file)):
+                    database.add_game(replay_pgn(pgn_game).game, number)
+            print(str(len(database)) + " positions stored.")
+        if args.fen:
+            key = Game.from_fen(args.fen)
+            games = sorted({database.game_id(entry) for entry in database.entries(key)})
+            print(
+                "Seen "
+                + str(database.count(key))
+                + " times in "
+                + str(len(games))
+                + " games."
+            )
@@ -0,0 +1,117 @@
+import sys
+import time
+from collections import namedtuple
+
+from bitboard import COLORS, PIECES, Move, square_position
+from game import Game
+
+#  This file replays recorded games without any prompts or printing.
+#  Each game is a sequence of moves, given either in long algebraic
+#  notation ('e2e4', 'e7e8q'), as (current_pos, end_pos) or
+#  (current_pos, end_pos, promotion) tuples in the format used by 'Game',
+#  or as 'Move' objects. Every move is checked against the rules before it
+#  is played and replay stops at the first one that is not legal.
+
+# 'game' is the Game after the last legal move and 'plies' the number of
+# moves played. 'illegal' is (index, move) for the first move that could
+# not be played, or None. 'status' is what Game.end returns for the side
+# that moved last, so "checkmate", "stalemate", "repetition" or False.
+ReplayResult = namedtuple("ReplayResult", ["game", "plies", "illegal", "status"])
+
+PROMOTION_NAMES = {"q": "queen", "r": "rook", "b": "bishop", "n": "knight"}
+
+
+# Turns text like 'e2e4' or 'e7e8q' into (current_pos, end_pos, promotion).
+# Returns None if the text is not a move.
+def parse_uci(text):
+    if len(text) not in (4, 5):
+        return None
+    current_pos = text[:2]
+    end_pos = text[2:4]
+    for pos in (current_pos, end_pos):
+        if pos[0] not in "abcdefgh" or pos[1] not in "12345678":
+            return None
+    if len(text) == 5:
+        if text[4] not in PROMOTION_NAMES:
+            return None
+        return current_pos, end_pos, PROMOTION_NAMES[text[4]]
+    return current_pos, end_pos, "queen"
+
+
+# Finds the legal Move in 'game' matching 'move' in any of the accepted
+# formats, or returns None.
+def resolve(game, move):
+    if isinstance(move, Move):
+        promotion = "queen" if move.promotion is None else PIECES[move.promotion]
+        move = (square_position(move.start), square_position(move.end), promotion)
+    if isinstance(move, str):
+        move = parse_uci(move)
+        if move is None:
+            return None
+    elif not isinstance(move, tuple) or len(move) not in (2, 3):
+        return None
+    try:
+        return game.find_move(*move)
+    except (ValueError, IndexError, TypeError):
+        return None
+
+
+# Plays 'moves' on 'game' (a new Game by default) and returns a ReplayResult.
+def replay(moves, game=None):
+    if game is None:
+        game = Game()
+    plies = 0
+    for move in moves:
+        legal = resolve(game, move)
+        if legal is None:
+            return ReplayResult(game, plies, (plies, move), False)
+        game.make_move(legal)
+        plies += 1
+    status = game.end(COLORS[game.position.turn ^ 1])
+    return ReplayResult(game, plies, None, status)
+
+
+# Replays every game in 'games', an iterable of move sequences, one after
+# another, yielding a ReplayResult for each. Nothing is kept between games.
+def replay_games(games):
+    for moves in games:
+        yield replay(moves)
+
+
+# Reads a file with one game per line, as space separated moves in long
+# algebraic notation, and prints how many games replayed cleanly.
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python replay.py GAMES_FILE")
+        raise SystemExit(2)
+    started = time.perf_counter()
+    games = 0
+    plies = 0
+    with open(sys.argv[1]) as games_file:
+        for line_number, result in enumerate(
+            replay_games(line.split() for line in games_file), 1
+        ):
+            games += 1
+            plies += result.plies
+            if result.illegal is not None:
+                index, move = result.illegal
+                print(
+                    "Game on line "
+                    + str(line_number)
+                    + ": move "
+                    + str(index + 1)
+                    + " ("
+                    + str(move)
+                    + ") is not legal."
+                )
+    elapsed = time.perf_counter() - started
+    print(
+        str(games)
+        + " games ("
+        + str(plies)
+        + " moves) replayed in "
+        + str(round(elapsed, 3))
+        + " seconds, "
+        + str(int(games / elapsed * 3600) if elapsed else 0)
+        + " games per hour."
+    )
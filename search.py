@@ -0,0 +1,384 @@
+import time
+from collections import namedtuple
+
+from bitboard import BLACK, WHITE, scan
+from movegen import generate_legal, legal_moves
+from transposition import EXACT, LOWER, UPPER, TranspositionTable, move_code
+
+#  This file picks moves for a computer player. It runs a negamax search
+#  with alpha-beta pruning on the 'Position' of a 'Game', deepening one ply
+#  at a time until it runs out of depth, time or nodes, or is told to stop.
+#  Positions are evaluated by material plus a bonus or penalty depending on
+#  the square each piece stands on.
+
+# 'move' is the best move found (None if there are no legal moves), 'score'
+# its value in centipawns for the side to move, 'depth' the deepest search
+# that finished, 'pv' the expected line of play starting with 'move',
+# 'nodes' the number of positions visited and 'seconds' the time taken.
+SearchResult = namedtuple(
+    "SearchResult", ["move", "score", "depth", "pv", "nodes", "seconds"]
+)
+
+MATE = 100000  # Score of being checkmated, less the plies it takes.
+MATE_BOUND = MATE - 1000  # Scores beyond this are mate scores.
+INFINITY = MATE + 1
+MAX_DEPTH = 64
+DEFAULT_DEPTH = 4  # Used when no depth, time or node limit is given.
+CHECK_INTERVAL = 64  # Nodes searched between two reads of the clock.
+
+PIECE_VALUES = (100, 320, 330, 500, 900, 0)
+
+# Square tables from white's side, written with the 8th row at the top.
+# They come from the "simplified evaluation function" and reward central,
+# developed pieces and a sheltered king.
+# fmt: off
+_TABLES = (
+    (  # pawn
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ),
+    (  # knight
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ),
+    (  # bishop
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ),
+    (  # rook
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ),
+    (  # queen
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ),
+    (  # king
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ),
+)
+# fmt: on
+
+# SQUARE_VALUES[color][piece][sq] is the piece value plus its square bonus.
+SQUARE_VALUES = [
+    [
+        [PIECE_VALUES[piece] + _TABLES[piece][sq ^ 56] for sq in range(64)]
+        for piece in range(6)
+    ],
+    [
+        [PIECE_VALUES[piece] + _TABLES[piece][sq] for sq in range(64)]
+        for piece in range(6)
+    ],
+]
+
+
+# Scores 'position' in centipawns from the point of view of the side to move.
+def evaluate(position):
+    score = 0
+    for piece in range(6):
+        white = SQUARE_VALUES[WHITE][piece]
+        black = SQUARE_VALUES[BLACK][piece]
+        for sq in scan(position.pieces[WHITE][piece]):
+            score += white[sq]
+        for sq in scan(position.pieces[BLACK][piece]):
+            score -= black[sq]
+    return score if position.turn == WHITE else -score
+
+
+# Captures are tried first, most valuable victim and least valuable
+# attacker first, then the remaining moves.
+def _capture_order(move):
+    if move.captured is None:
+        return 0
+    return 10 * PIECE_VALUES[move.captured] - PIECE_VALUES[move.piece] + 10000
+
+
+class Searcher:
+    # 'game' is the Game to search. Its position is changed during the
+    # search and put back afterwards. 'table' is the TranspositionTable to
+    # use; pass the same one to later searches to reuse what it learned.
+    # With a 'tablebase' (see tablebase.py), positions with few pieces get
+    # their exact score instead of being searched.
+    def __init__(self, game, table=None, tablebase=None):
+        self.game = game
+        self.table = TranspositionTable() if table is None else table
+        self.tablebase = tablebase
+        self.nodes = 0
+        self._stop_requested = False
+        self._deadline = None
+        self._next_check = 0  # node count at which to read the clock next
+        self._node_limit = None
+        self._path = []  # hashes of the positions on the current line
+        self._killers = []
+        self._pv = []
+
+    # Asks a running search to stop as soon as possible. Safe to call from
+    # another thread; search() then returns the best move found so far.
+    def stop(self):
+        self._stop_requested = True
+
+    # Searches the current position and returns a SearchResult. 'max_depth'
+    # is in plies, 'time_limit' in seconds and 'node_limit' in positions.
+    # The search stops at whichever limit comes first; if none is given it
+    # searches DEFAULT_DEPTH plies. A 'max_depth' of 0 only scores the
+    # position with a search of its captures and returns no move.
+    # 'on_iteration' is called with a SearchResult after every finished
+    # depth.
+    def search(
+        self, max_depth=None, time_limit=None, node_limit=None, on_iteration=None
+    ):
+        if max_depth is None:
+            if time_limit is None and node_limit is None:
+                max_depth = DEFAULT_DEPTH
+            else:
+                max_depth = MAX_DEPTH
+        started = time.perf_counter()
+        self.nodes = 0
+        self._stop_requested = False
+        self._deadline = None if time_limit is None else started + time_limit
+        self._next_check = 0
+        self._node_limit = node_limit
+        self._path = []
+        self._killers = [[None, None] for ply in range(MAX_DEPTH + 1)]
+        self._pv = [[] for ply in range(MAX_DEPTH + 2)]
+        self.table.new_search()
+
+        position = self.game.position
+        moves = legal_moves(position)
+        if not moves:
+            score = -MATE if position.checkers(position.turn) else 0
+            return SearchResult(None, score, 0, [], 0, 0.0)
+
+        if max_depth < 1:
+            # No move is searched; the position is only scored once its
+            # captures have played out.
+            score = self._quiesce(0, -INFINITY, INFINITY)
+            seconds = time.perf_counter() - started
+            return SearchResult(None, score, 0, [], self.nodes, seconds)
+
+        best = SearchResult(moves[0], 0, 0, [moves[0]], 0, 0.0)
+        previous_pv = []
+        for depth in range(1, min(max_depth, MAX_DEPTH) + 1):
+            score = self._negamax(depth, 0, -INFINITY, INFINITY, previous_pv)
+            if self._stopped() and (depth > 1 or not self._pv[0]):
+                break
+            previous_pv = self._pv[0][:]
+            best = SearchResult(
+                previous_pv[0],
+                score,
+                depth,
+                previous_pv,
+                self.nodes,
+                time.perf_counter() - started,
+            )
+            if on_iteration is not None:
+                on_iteration(best)
+            if self._stopped() or abs(score) > MATE_BOUND:
+                break
+        return best._replace(nodes=self.nodes, seconds=time.perf_counter() - started)
+
+    # True once the search has been asked to stop or has used up its budget.
+    # The clock is only read once every CHECK_INTERVAL nodes.
+    def _stopped(self):
+        if self._stop_requested:
+            return True
+        if self._node_limit is not None and self.nodes >= self._node_limit:
+            self._stop_requested = True
+        elif self._deadline is not None and self.nodes >= self._next_check:
+            self._next_check = self.nodes + CHECK_INTERVAL
+            if time.perf_counter() >= self._deadline:
+                self._stop_requested = True
+        return self._stop_requested
+
+    # A position that already occurred on the way here is scored as a draw.
+    def _is_repetition(self, key):
+        return key in self._path or key in self.game.repetitions
+
+    def _negamax(self, depth, ply, alpha, beta, previous_pv):
+        position = self.game.position
+        self.nodes += 1
+        self._pv[ply] = []
+        if ply and self._is_repetition(position.hash):
+            return 0
+        if ply and self.tablebase is not None:
+            found = self.tablebase.probe(position)
+            if found is not None:
+                if found.result == "draw":
+                    return 0
+                if found.result == "win":
+                    return MATE - ply - found.dtm
+                return -MATE + ply + found.dtm
+        in_check = position.checkers(position.turn)
+        if in_check and ply < MAX_DEPTH:
+            depth += 1  # Look one ply further when in check.
+        if depth <= 0 or ply >= MAX_DEPTH:
+            return self._quiesce(ply, alpha, beta)
+
+        key = position.hash
+        entry = self.table.probe(key)
+        table_move = 0
+        if entry is not None:
+            table_move = entry.move
+            if ply and entry.depth >= depth:
+                score = _score_from_table(entry.score, ply)
+                if (
+                    entry.bound == EXACT
+                    or (entry.bound == LOWER and score >= beta)
+                    or (entry.bound == UPPER and score <= alpha)
+                ):
+                    return score
+
+        moves = legal_moves(position)
+        if not moves:
+            return -MATE + ply if in_check else 0
+        killers = self._killers[ply]
+        pv_move = previous_pv[ply] if ply < len(previous_pv) else None
+
+        def order(move):
+            if move == pv_move:
+                return 100000
+            if table_move and move_code(move) == table_move:
+                return 90000
+            if move in killers:
+                return 5000
+            return _capture_order(move)
+
+        moves.sort(key=order, reverse=True)
+
+        castling = position.castling
+        ep_square = position.ep_square
+        self._path.append(key)
+        original_alpha = alpha
+        best = -INFINITY
+        best_move = None
+        for move in moves:
+            position.play(move)
+            score = -self._negamax(
+                depth - 1,
+                ply + 1,
+                -beta,
+                -alpha,
+                previous_pv if move == pv_move else (),
+            )
+            position.undo(move, castling, ep_square, key)
+            if self._stopped():
+                self._path.pop()
+                # At the root, the moves searched in full still give a
+                # score for the part of the PV that search keeps.
+                return best if ply == 0 and best_move is not None else 0
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self._pv[ply] = [move] + self._pv[ply + 1]
+                    if alpha >= beta:
+                        if move.captured is None and move != killers[0]:
+                            killers[1] = killers[0]
+                            killers[0] = move
+                        break
+        self._path.pop()
+        if best >= beta:
+            bound = LOWER
+        elif best > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.table.store(
+            key, depth, bound, _score_to_table(best, ply), move_code(best_move)
+        )
+        return best
+
+    # Searches captures only until the position is quiet, so that the
+    # evaluation is never taken in the middle of an exchange.
+    def _quiesce(self, ply, alpha, beta):
+        position = self.game.position
+        self.nodes += 1
+        standing = evaluate(position)
+        if standing >= beta:
+            return standing
+        if standing > alpha:
+            alpha = standing
+        captures = [
+            move
+            for move in generate_legal(position)
+            if move.captured is not None or move.promotion is not None
+        ]
+        captures.sort(key=_capture_order, reverse=True)
+        castling = position.castling
+        ep_square = position.ep_square
+        key = position.hash
+        for move in captures:
+            position.play(move)
+            score = -self._quiesce(ply + 1, -beta, -alpha)
+            position.undo(move, castling, ep_square, key)
+            if self._stopped():
+                return 0
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+# Mate scores count plies from the root of the search, but the table may
+# be probed from a different ply, so they are stored counting from the
+# position itself.
+def _score_to_table(score, ply):
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+# Searches 'game' with a new Searcher; see Searcher.search for the limits.
+def search(
+    game, max_depth=None, time_limit=None, node_limit=None, table=None, tablebase=None
+):
+    return Searcher(game, table, tablebase).search(max_depth, time_limit, node_limit)
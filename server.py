@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import sys
+
+from game import Game
+from replay import resolve
+
+#  This file runs a server that hosts many games at once over a simple line
+#  protocol, on a TCP port or a Unix socket. Every connection is handled by
+#  one asyncio task and every game is a 'Game' kept in one dictionary, so a
+#  single process can serve thousands of games. The rules are fast enough
+#  to check between two reads of a socket, so no command ever blocks the
+#  others. A game belongs to the connection that started it: no other
+#  connection can see or change it, and it is closed when that connection
+#  ends.
+#
+#  Each request is one line, a command followed by its arguments:
+#
+#    NEW [FEN]          start a game, from FEN if given; replies with its number
+#    MOVE GAME MOVE     play a move in long algebraic notation ('e2e4',
+#                       'e7e8q'); replies with the game's status afterwards
+#    UNDO GAME          take back the last move
+#    FEN GAME           the position as a FEN string
+#    MOVES GAME         the legal moves
+#    STATUS GAME        "ongoing", "checkmate", "stalemate", "fifty-move",
+#                       "repetition" or "insufficient material"
+#    CLOSE GAME         end a game and forget it
+#    GAMES              the number of games being hosted
+#    QUIT               close the connection
+#
+#  Every reply is one line starting with "OK" or, when the request could not
+#  be carried out, "ERR" and a reason.
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_GAMES = 100000
+MAX_LINE = 1024
+
+
+class GameServer:
+    # 'max_games' is how many games may be hosted at the same time.
+    def __init__(self, max_games=DEFAULT_MAX_GAMES):
+        self.max_games = max_games
+        self.games = {}
+        self._next_id = 1
+        # Each command with the fewest and most arguments it takes.
+        self._commands = {
+            "NEW": (self._new, 0, 6),
+            "MOVE": (self._move, 2, 2),
+            "UNDO": (self._undo, 1, 1),
+            "FEN": (self._fen, 1, 1),
+            "MOVES": (self._moves, 1, 1),
+            "STATUS": (self._status, 1, 1),
+            "CLOSE": (self._close, 1, 1),
+            "GAMES": (self._count, 0, 0),
+        }
+
+    # Carries out one request line and returns the reply line, without the
+    # newline. 'owned' is the set of the numbers of the games the client
+    # started; only those can be used, and NEW and CLOSE update it.
+    def handle(self, line, owned):
+        words = line.split()
+        if not words:
+            return "ERR empty request"
+        name = words[0].upper()
+        if name not in self._commands:
+            return "ERR unknown command " + words[0]
+        command, fewest, most = self._commands[name]
+        if not fewest <= len(words) - 1 <= most:
+            return "ERR wrong number of arguments for " + name
+        try:
+            return "OK " + command(owned, *words[1:])
+        except ValueError as error:
+            return "ERR " + str(error)
+
+    # Serves one connection until the client sends QUIT or hangs up.
+    # Every game it started is closed when it ends.
+    async def serve_client(self, reader, writer):
+        owned = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(b"ERR request too long\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                text = line.decode("utf-8", "replace").strip()
+                if text.upper() == "QUIT":
+                    writer.write(b"OK bye\n")
+                    await writer.drain()
+                    break
+                writer.write((self.handle(text, owned) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for number in owned:
+                del self.games[number]
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    # Starts listening on 'host' and 'port', or on the Unix socket at 'path'
+    # if one is given, and returns the asyncio Server.
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT, path=None):
+        if path is not None:
+            return await asyncio.start_unix_server(
+                self.serve_client, path, limit=MAX_LINE
+            )
+        return await asyncio.start_server(
+            self.serve_client, host, port, limit=MAX_LINE
+        )
+
+    def _game(self, owned, number):
+        if not number.isdecimal() or int(number) not in owned:
+            raise ValueError("no game " + number)
+        return self.games[int(number)]
+
+    def _new(self, owned, *fen):
+        if len(self.games) >= self.max_games:
+            raise ValueError("too many games")
+        game = Game.from_fen(" ".join(fen)) if fen else Game()
+        number = self._next_id
+        self._next_id += 1
+        self.games[number] = game
+        owned.add(number)
+        return str(number)
+
+    def _move(self, owned, number, text):
+        game = self._game(owned, number)
+        if game.status() != "ongoing":
+            raise ValueError("the game is over")
+        move = resolve(game, text)
+        if move is None:
+            raise ValueError("illegal move " + text)
+        game.make_move(move)
+        return game.status()
+
+    def _undo(self, owned, number):
+        game = self._game(owned, number)
+        if not game.move_stack:
+            raise ValueError("no moves to take back")
+        return str(game.unmake_move())
+
+    def _fen(self, owned, number):
+        return self._game(owned, number).to_fen()
+
+    def _moves(self, owned, number):
+        game = self._game(owned, number)
+        return " ".join(move.uci() for move in game.legal_moves())
+
+    def _status(self, owned, number):
+        return self._game(owned, number).status()
+
+    def _close(self, owned, number):
+        self._game(owned, number)
+        owned.remove(int(number))
+        del self.games[int(number)]
+        return number
+
+    def _count(self, owned):
+        return str(len(self.games))
+
+
+class Client:
+    # A connection to a GameServer. Open it with 'await Client.connect(...)'.
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=DEFAULT_PORT, path=None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    # Sends one request line and returns the reply without its newline.
+    async def request(self, line):
+        self.writer.write((line + "\n").encode())
+        await self.writer.drain()
+        reply = await self.reader.readline()
+        if not reply:
+            raise ConnectionError("the server closed the connection")
+        return reply.decode().rstrip("\n")
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def _run_server(args):
+    server = await GameServer(args.max_games).start(args.host, args.port, args.unix)
+    print(
+        "Serving on "
+        + (args.unix or args.host + ":" + str(args.port))
+        + ". Press Ctrl-C to stop."
+    )
+    async with server:
+        await server.serve_forever()
+
+
+# Reads requests from standard input, sends them and prints the replies.
+async def _run_client(args):
+    client = await Client.connect(args.host, args.port, args.unix)
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line or line.strip().upper() == "QUIT":
+                break
+            if line.strip():
+                print(await client.request(line.strip()))
+    finally:
+        await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host many games over a socket.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to use")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port")
+    parser.add_argument("--unix", metavar="PATH", help="use a Unix socket instead")
+    parser.add_argument(
+        "--max-games",
+        type=int,
+        default=DEFAULT_MAX_GAMES,
+        help="most games hosted at once",
+    )
+    parser.add_argument(
+        "--client", action="store_true", help="connect to a server and send requests"
+    )
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_run_client(args) if args.client else _run_server(args))
+    except KeyboardInterrupt:
+        pass
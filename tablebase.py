@@ -0,0 +1,614 @@
+import argparse
+import mmap
+import os
+import time
+from collections import namedtuple
+from itertools import product
+
+from bitboard import (
+    BISHOP,
+    BLACK,
+    KING,
+    KNIGHT,
+    PAWN,
+    ROOK,
+    WHITE,
+    bishop_attacks,
+    king_attacks,
+    knight_attacks,
+    pawn_attacks,
+    queen_attacks,
+    rook_attacks,
+    scan,
+)
+from movegen import PROMOTIONS
+
+#  This file builds and reads endgame tablebases for positions with three
+#  or four pieces (kings included). A table covers one set of material,
+#  named like "KQvKR" with the stronger side first, and holds one byte per
+#  position: the exact result and the number of plies to mate with best
+#  play. Tables are built by retrograde analysis, working backwards from
+#  the checkmates one ply at a time, and captures and promotions are looked
+#  up in the smaller tables, which are built first.
+#
+#  A position is stored under the squares of its pieces, white king first,
+#  then the other white pieces, the black king and the other black pieces.
+#  Turning or mirroring the board does not change a position without
+#  castling rights, so of the positions that turn into each other only one
+#  is stored: with pawns on the board, where they fix which way is forward,
+#  the one with the white king on the a to d files, and without pawns the
+#  one with the white king in the triangle a1-d1-d4. Kings on the same or
+#  neighbouring squares and pawns on the first or last row are left out.
+#  Castling and en passant are not covered.
+#
+#  Building is slow, as it is all done in Python. A three piece table takes
+#  a few seconds. A four piece table has 3.8 million positions without
+#  pawns and takes two to five minutes, and up to 11 million with pawns,
+#  taking around eight minutes and under 200 MB of memory. All 30 of them
+#  ("--pieces 4") take about two and a half hours. Each table is built once
+#  and then only read.
+
+# 'result' is "win", "loss" or "draw" for the side to move and 'dtm' the
+# number of plies to mate with best play (None for a draw).
+TablebaseResult = namedtuple("TablebaseResult", ["result", "dtm"])
+
+MAX_PIECES = 4
+SUFFIX = ".tb"
+
+# A stored byte is 0 for a draw, INVALID for an impossible position and
+# otherwise the number of plies to mate plus one. An even number of plies
+# means the side to move is getting mated, an odd number that it mates.
+DRAW = 0
+INVALID = 255
+
+PIECE_LETTERS = "PNBRQK"
+
+
+# Mirrors a square in the a1-h8 diagonal, swapping its row and column.
+def _transposed(sq):
+    return (sq & 7) << 3 | sq >> 3
+
+
+# The eight ways of turning the board onto itself, as the square each
+# square goes to: none, mirrored left to right, top to bottom or both, and
+# the same with the rows and columns swapped. Only the first two keep pawns
+# moving forward.
+_SYMMETRIES = [tuple(sq ^ flip for sq in range(64)) for flip in (0, 7, 56, 63)]
+_SYMMETRIES += [tuple(_transposed(sq) for sq in table) for table in _SYMMETRIES]
+
+
+# The table name for the pieces of each side, e.g. [QUEEN], [] -> "KQvK".
+def _name(white, black):
+    return (
+        "K"
+        + "".join(PIECE_LETTERS[piece] for piece in white)
+        + "vK"
+        + "".join(PIECE_LETTERS[piece] for piece in black)
+    )
+
+
+# Orders a side's pieces (without the king) from strongest to weakest, so
+# that the side with more or stronger pieces compares greater.
+def _strength(pieces):
+    return len(pieces), sorted(pieces, reverse=True)
+
+
+# Turns a name like "KQvKR" into the (color, piece) of each stored square.
+def _layout(name):
+    sides = name.upper().split("V")
+    if len(sides) != 2 or not all(side.startswith("K") for side in sides):
+        raise ValueError("invalid tablebase name: " + repr(name))
+    layout = []
+    for color, side in zip((WHITE, BLACK), sides):
+        if any(letter not in PIECE_LETTERS[:KING] for letter in side[1:]):
+            raise ValueError("invalid tablebase name: " + repr(name))
+        pieces = sorted(
+            (PIECE_LETTERS.index(letter) for letter in side[1:]), reverse=True
+        )
+        layout.append((color, KING))
+        layout.extend((color, piece) for piece in pieces)
+    white = [piece for color, piece in layout if color == WHITE][1:]
+    black = [piece for color, piece in layout if color == BLACK][1:]
+    if _strength(white) < _strength(black):
+        raise ValueError("the stronger side comes first: " + repr(name))
+    if len(layout) > MAX_PIECES:
+        raise ValueError("at most " + str(MAX_PIECES) + " pieces: " + repr(name))
+    return layout
+
+
+# The names of every table with 'pieces' pieces, stronger side first.
+def names(pieces):
+    others = range(PAWN, KING)
+    found = []
+    for white_count in range(pieces - 1, -1, -1):
+        black_count = pieces - 2 - white_count
+        if black_count < 0 or white_count < black_count:
+            continue
+        for white in product(others, repeat=white_count):
+            for black in product(others, repeat=black_count):
+                if list(white) != sorted(white, reverse=True):
+                    continue
+                if list(black) != sorted(black, reverse=True):
+                    continue
+                if _strength(list(white)) < _strength(list(black)):
+                    continue
+                found.append(_name(white, black))
+    return found
+
+
+# Numbers the positions of a table laid out as 'layout'. The side to move
+# and the two kings come first, as one of the pairs of king squares that
+# are stored, then the other pieces in order, each as one of 64 squares or,
+# for a pawn, one of the 48 squares of rows 2 to 7.
+class _Indexer:
+    def __init__(self, layout):
+        self.black_king = layout.index((BLACK, KING))
+        self.others = [
+            number for number in range(1, len(layout)) if number != self.black_king
+        ]
+        self.pawns = [layout[number][1] == PAWN for number in self.others]
+        triangle = not any(self.pawns)  # the white king kept to a1-d1-d4
+        symmetries = _SYMMETRIES if triangle else _SYMMETRIES[:2]
+
+        # For every pair of king squares, as white_king << 6 | black_king,
+        # the number of the stored pair it turns into, the symmetry that
+        # does it and, when both kings end up on the a1-h8 diagonal, the
+        # same symmetry with the rows and columns swapped after it. Which of
+        # the two is used then depends on the first piece off the diagonal,
+        # which must end up below it.
+        found = {}
+        for white_king, black_king in product(range(64), repeat=2):
+            if king_attacks(white_king) & (1 << black_king) or white_king == black_king:
+                continue
+            for symmetry in symmetries:
+                king = symmetry[white_king]
+                row, col = king >> 3, king & 7
+                if col > 3 or triangle and row > col:
+                    continue
+                other = symmetry[black_king]
+                if triangle and row == col and other >> 3 > other & 7:
+                    continue
+                found[white_king << 6 | black_king] = (king, other, symmetry)
+                break
+        self.kings = sorted({(king, other) for king, other, _ in found.values()})
+        numbers = {pair: number for number, pair in enumerate(self.kings)}
+        self.pairs = [None] * 4096
+        for key, (king, other, symmetry) in found.items():
+            transposed = None
+            if triangle and king >> 3 == king & 7 and other >> 3 == other & 7:
+                transposed = tuple(_transposed(sq) for sq in symmetry)
+            self.pairs[key] = (numbers[king, other], symmetry, transposed)
+
+        self.size = 2 * len(self.kings)
+        for pawn in self.pawns:
+            self.size *= 48 if pawn else 64
+
+    # The index of the position with the pieces on 'squares' (in the order
+    # of the layout) and 'turn' to move, or None if it is not stored.
+    def index(self, squares, turn):
+        entry = self.pairs[squares[0] << 6 | squares[self.black_king]]
+        if entry is None:
+            return None
+        number, symmetry, transposed = entry
+        if transposed is not None:
+            for other in self.others:
+                sq = symmetry[squares[other]]
+                if sq >> 3 != sq & 7:
+                    if sq >> 3 > sq & 7:
+                        symmetry = transposed
+                    break
+        index = turn * len(self.kings) + number
+        for other, pawn in zip(self.others, self.pawns):
+            sq = symmetry[squares[other]]
+            if not pawn:
+                index = index << 6 | sq
+            elif 8 <= sq < 56:
+                index = index * 48 + sq - 8
+            else:
+                return None
+        return index
+
+    # The side to move and squares of the position at 'index'.
+    def squares(self, index):
+        others = []
+        for pawn in reversed(self.pawns):
+            if pawn:
+                others.append(index % 48 + 8)
+                index //= 48
+            else:
+                others.append(index & 63)
+                index >>= 6
+        others.reverse()
+        turn, number = divmod(index, len(self.kings))
+        white_king, black_king = self.kings[number]
+        squares = [white_king] + others
+        squares.insert(self.black_king, black_king)
+        return turn, squares
+
+
+def _attacks(piece, color, sq, occupied):
+    if piece == PAWN:
+        return pawn_attacks(color, sq)
+    if piece == KNIGHT:
+        return knight_attacks(sq)
+    if piece == KING:
+        return king_attacks(sq)
+    if piece == BISHOP:
+        return bishop_attacks(sq, occupied)
+    if piece == ROOK:
+        return rook_attacks(sq, occupied)
+    return queen_attacks(sq, occupied)
+
+
+# True if any of 'pieces', a list of (color, piece, sq), attacks 'target'.
+def _attacked(pieces, target, occupied):
+    for color, piece, sq in pieces:
+        if _attacks(piece, color, sq, occupied) & (1 << target):
+            return True
+    return False
+
+
+def _result(value):
+    if value == DRAW:
+        return TablebaseResult("draw", None)
+    plies = value - 1
+    return TablebaseResult("loss" if plies % 2 == 0 else "win", plies)
+
+
+class Tablebase:
+    # 'directory' holds the table files, one per set of material. Tables
+    # are memory-mapped the first time they are needed.
+    def __init__(self, directory):
+        self.directory = directory
+        self._tables = {}
+        self._indexers = {}
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for table in self._tables.values():
+            if isinstance(table, mmap.mmap):
+                table.close()
+        for handle in self._files:
+            handle.close()
+        self._tables = {}
+        self._files = []
+
+    def path(self, name):
+        return os.path.join(self.directory, name + SUFFIX)
+
+    def _table(self, name):
+        if name not in self._tables:
+            table = None
+            if os.path.exists(self.path(name)):
+                handle = open(self.path(name), "rb")
+                self._files.append(handle)
+                table = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+                if len(table) != self._indexer(name).size:
+                    table.close()
+                    raise ValueError(
+                        self.path(name) + " does not fit this version; build it again"
+                    )
+            self._tables[name] = table
+        return self._tables[name]
+
+    def _indexer(self, name):
+        if name not in self._indexers:
+            self._indexers[name] = _Indexer(_layout(name))
+        return self._indexers[name]
+
+    # The stored byte for 'pieces', a list of (color, piece, sq), with 'turn'
+    # to move, or None if its table is missing. Positions where black has
+    # the stronger pieces are looked up with the colours swapped and the
+    # board turned around.
+    def _value(self, pieces, turn):
+        white = [(piece, sq) for color, piece, sq in pieces if color == WHITE]
+        black = [(piece, sq) for color, piece, sq in pieces if color == BLACK]
+        if len(white) == 1 and len(black) == 1:
+            return DRAW
+        white.sort(reverse=True)
+        black.sort(reverse=True)
+        if _strength([piece for piece, sq in white[1:]]) < _strength(
+            [piece for piece, sq in black[1:]]
+        ):
+            white, black = (
+                [(piece, sq ^ 56) for piece, sq in black],
+                [(piece, sq ^ 56) for piece, sq in white],
+            )
+            turn ^= 1
+        name = _name(
+            [piece for piece, sq in white[1:]], [piece for piece, sq in black[1:]]
+        )
+        table = self._table(name)
+        if table is None:
+            return None
+        index = self._indexer(name).index([sq for piece, sq in white + black], turn)
+        return INVALID if index is None else table[index]
+
+    # Looks up the position of 'game' (a Game or a Position). Returns a
+    # TablebaseResult, or None if the position has too many pieces,
+    # castling rights or an en passant capture, or its table is missing.
+    def probe(self, game):
+        position = getattr(game, "position", game)
+        if position.occupied.bit_count() > MAX_PIECES or position.castling:
+            return None
+        ep_square = position.ep_square
+        turn = position.turn
+        if (
+            ep_square is not None
+            and pawn_attacks(turn ^ 1, ep_square) & position.pieces[turn][PAWN]
+        ):
+            return None
+        pieces = [
+            (color, piece, sq)
+            for color in (WHITE, BLACK)
+            for piece in range(6)
+            for sq in scan(position.pieces[color][piece])
+        ]
+        value = self._value(pieces, turn)
+        if value is None or value == INVALID:
+            return None
+        return _result(value)
+
+    # Builds the table 'name' (e.g. "KRvK") and every smaller table it needs
+    # that is not in the directory yet, and returns its path.
+    def generate(self, name, verbose=False):
+        layout = _layout(name)
+        for smaller in self._dependencies(layout):
+            if self._table(smaller) is None:
+                self.generate(smaller, verbose)
+        started = time.perf_counter()
+        if verbose:
+            print(
+                name
+                + ": building "
+                + str(self._indexer(name).size)
+                + " positions...",
+                flush=True,
+            )
+        values = _Generator(self, layout, self._indexer(name)).run()
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(name), "wb") as table_file:
+            table_file.write(values)
+        self._tables.pop(name, None)
+        if verbose:
+            print(
+                name
+                + ": "
+                + str(len(values))
+                + " positions in "
+                + str(round(time.perf_counter() - started, 1))
+                + " seconds."
+            )
+        return self.path(name)
+
+    # The tables reached by capturing a piece or promoting a pawn.
+    def _dependencies(self, layout):
+        found = []
+        for index, (color, piece) in enumerate(layout):
+            if piece == KING:
+                continue
+            changes = [None]
+            if piece == PAWN:
+                changes.extend(PROMOTIONS)
+            for change in changes:
+                rest = [
+                    (other_color, change if other == index else other_piece)
+                    for other, (other_color, other_piece) in enumerate(layout)
+                    if change is not None or other != index
+                ]
+                white = [p for c, p in rest if c == WHITE][1:]
+                black = [p for c, p in rest if c == BLACK][1:]
+                if not white and not black:
+                    continue
+                if _strength(white) < _strength(black):
+                    white, black = black, white
+                name = _name(sorted(white, reverse=True), sorted(black, reverse=True))
+                if name not in found:
+                    found.append(name)
+        return found
+
+
+# Works out one table. Every position is first given its number of legal
+# moves, and the results of moves that leave the table (captures and
+# promotions) are read from the smaller tables. Then, one ply at a time,
+# positions whose moves all lose are marked as lost, and positions with a
+# move to a lost position as won. As only one of the positions that turn
+# into each other is stored, two moves can lead to the same stored
+# position; moves within the table are therefore counted by the positions
+# they lead to, and each earlier position is visited once.
+class _Generator:
+    def __init__(self, tablebase, layout, indexer):
+        self.tablebase = tablebase
+        self.layout = layout
+        self.indexer = indexer
+        self.pieces = len(layout)
+        self.values = bytearray(indexer.size)
+        self.counts = bytearray(len(self.values))
+        self.events = {}  # ply -> [(index, won)] from moves leaving the table
+
+    def run(self):
+        indexer = self.indexer
+        values = self.values
+        current = []
+        index = 0
+        ranges = [range(8, 56) if pawn else range(64) for pawn in indexer.pawns]
+        for turn in (WHITE, BLACK):
+            for white_king, black_king in indexer.kings:
+                for others in product(*ranges):
+                    squares = [white_king, *others]
+                    squares.insert(indexer.black_king, black_king)
+                    if indexer.index(squares, turn) != index:
+                        value = INVALID  # Stored under another index.
+                    else:
+                        value = self._setup(index, turn, squares)
+                    if value is not None:
+                        values[index] = value
+                        if value == 1:
+                            current.append(index)
+                    index += 1
+
+        plies = 0
+        while current or any(ply > plies for ply in self.events):
+            following = []
+            won = plies % 2 == 1
+            for index in current:
+                for previous in self._predecessors(index):
+                    self._reached(previous, won, plies + 1, following)
+            for index, won_by_exit in self.events.pop(plies + 1, ()):
+                self._reached(index, not won_by_exit, plies + 1, following)
+            current = following
+            plies += 1
+        return values
+
+    # Records that 'index' has a move to a position that is won (or, with
+    # 'won' False, lost) for the opponent, 'plies' - 1 plies from mate.
+    def _reached(self, index, won, plies, following):
+        values = self.values
+        if values[index]:
+            return
+        if won:
+            self.counts[index] -= 1
+            if self.counts[index]:
+                return
+        if plies + 1 >= INVALID:
+            raise ValueError("distance to mate too long to store")
+        values[index] = plies + 1
+        following.append(index)
+
+    # Counts the legal moves of a position and looks up those that leave
+    # the table. Returns INVALID for impossible positions, 1 for checkmate,
+    # DRAW for stalemate and None otherwise.
+    def _setup(self, index, turn, squares):
+        layout = self.layout
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+        if occupied.bit_count() != self.pieces:
+            return INVALID
+        pieces = [(color, piece, sq) for (color, piece), sq in zip(layout, squares)]
+        for color, piece, sq in pieces:
+            if piece == PAWN and (sq < 8 or sq >= 56):
+                return INVALID
+        own = [entry for entry in pieces if entry[0] == turn]
+        enemy = [entry for entry in pieces if entry[0] != turn]
+        first = 0 if turn == WHITE else self.indexer.black_king  # of 'own'
+        children = set()  # the positions reached without leaving the table
+        if _attacked(own, enemy[0][2], occupied):
+            return INVALID  # The side that just moved is in check.
+        own_occupied = 0
+        for color, piece, sq in own:
+            own_occupied |= 1 << sq
+        enemy_occupied = occupied ^ own_occupied
+
+        count = 0
+        for number, (color, piece, start) in enumerate(own):
+            if piece == PAWN:
+                forward = 8 if color == WHITE else -8
+                targets = pawn_attacks(color, start) & enemy_occupied
+                one = start + forward
+                if not occupied & (1 << one):
+                    targets |= 1 << one
+                    two = one + forward
+                    if (start >> 3) == (1 if color == WHITE else 6) and not occupied & (
+                        1 << two
+                    ):
+                        targets |= 1 << two
+            else:
+                targets = _attacks(piece, color, start, occupied) & ~own_occupied
+            for end in scan(targets):
+                moved = occupied ^ (1 << start) | (1 << end)
+                others = [entry for entry in enemy if entry[2] != end]
+                king = end if piece == KING else own[0][2]
+                if _attacked(others, king, moved):
+                    continue
+                promotions = (None,)
+                if piece == PAWN and (end < 8 or end >= 56):
+                    promotions = PROMOTIONS
+                for promotion in promotions:
+                    if promotion is None and len(others) == len(enemy):
+                        # The move stays in this table.
+                        after = list(squares)
+                        after[first + number] = end
+                        children.add(self.indexer.index(after, turn ^ 1))
+                        continue
+                    count += 1
+                    after = (
+                        own[:number]
+                        + [(color, piece if promotion is None else promotion, end)]
+                        + own[number + 1 :]
+                        + others
+                    )
+                    value = self.tablebase._value(after, turn ^ 1)
+                    if value is None:
+                        raise ValueError("a smaller table is missing")
+                    if value != DRAW:
+                        self.events.setdefault(value, []).append(
+                            (index, (value - 1) % 2 == 0)
+                        )
+        count += len(children)
+        if not count:
+            in_check = _attacked(enemy, own[0][2], occupied)
+            return 1 if in_check else DRAW
+        self.counts[index] = min(count, 254)
+        return None
+
+    # The indices of the positions in this table, with the other side to
+    # move, that have a move leading to the position at 'index'.
+    def _predecessors(self, index):
+        layout = self.layout
+        found = set()
+        turn, squares = self.indexer.squares(index)
+        mover = turn ^ 1
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+        for number, (color, piece) in enumerate(layout):
+            if color != mover:
+                continue
+            end = squares[number]
+            if piece == PAWN:
+                back = -8 if color == WHITE else 8
+                one = end + back
+                starts = 0
+                if 8 <= one < 56 and not occupied & (1 << one):
+                    starts = 1 << one
+                    two = one + back
+                    if (end >> 3) == (3 if color == WHITE else 4) and not occupied & (
+                        1 << two
+                    ):
+                        starts |= 1 << two
+            else:
+                starts = _attacks(piece, color, end, occupied) & ~occupied
+            for start in scan(starts):
+                squares[number] = start
+                found.add(self.indexer.index(squares, mover))
+            squares[number] = end
+        found.discard(None)  # A king moved next to the other one.
+        return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build endgame tablebases.")
+    parser.add_argument("directory", help="where the table files go")
+    parser.add_argument(
+        "names", nargs="*", help="tables to build, e.g. KQvK (default: all)"
+    )
+    parser.add_argument(
+        "--pieces",
+        type=int,
+        default=3,
+        help="build every table with this many pieces",
+    )
+    args = parser.parse_args()
+
+    tablebase = Tablebase(args.directory)
+    for name in args.names or names(args.pieces):
+        if tablebase._table(name) is None:
+            tablebase.generate(name, verbose=True)
+    tablebase.close()
@@ -0,0 +1,133 @@
+from array import array
+from collections import namedtuple
+
+#  This file holds a transposition table: a fixed-size store of search
+#  results keyed by the Zobrist hash of a 'Position', so that a position
+#  reached again through a different order of moves is not searched again.
+#  The table never grows past the memory it is given. Each bucket has two
+#  slots, one kept for the deepest result seen and one that is always
+#  overwritten, and older entries are given up first when a slot is needed.
+
+# How a stored score relates to the true value of the position.
+EXACT = 1
+LOWER = 2  # The true score is at least 'score' (the search failed high).
+UPPER = 3  # The true score is at most 'score' (the search failed low).
+
+DEFAULT_SIZE_MB = 16
+ENTRY_BYTES = 16  # One 64-bit key and one 64-bit packed value.
+
+# 'depth' is the depth the position was searched to, 'bound' one of EXACT,
+# LOWER or UPPER, 'score' the score found and 'move' the best move as packed
+# by move_code (0 when none is known).
+TableEntry = namedtuple("TableEntry", ["depth", "bound", "score", "move"])
+
+# Packed values hold, from the lowest bit up, 16 bits of move, 8 of depth,
+# 2 of bound, 8 of age and the score offset by _SCORE_OFFSET.
+_DEPTH_SHIFT = 16
+_BOUND_SHIFT = 24
+_AGE_SHIFT = 26
+_SCORE_SHIFT = 34
+_SCORE_OFFSET = 1 << 29
+
+
+# Packs the start square, end square and promotion of 'move' into 16 bits:
+# 6 bits per square and 3 for the promotion (the piece code plus one).
+def move_code(move):
+    if move is None:
+        return 0
+    promotion = 0 if move.promotion is None else move.promotion + 1
+    return move.start | move.end << 6 | promotion << 12
+
+
+class TranspositionTable:
+    # 'size_mb' is the most memory, in megabytes, the entries may use.
+    def __init__(self, size_mb=DEFAULT_SIZE_MB):
+        buckets = max(1, int(size_mb * (1 << 20)) // (2 * ENTRY_BYTES))
+        self.size_mb = size_mb
+        self.buckets = buckets
+        self.keys = array("Q", bytes(16 * buckets))
+        self.values = array("Q", bytes(16 * buckets))
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    # Empties the table and resets the statistics.
+    def clear(self):
+        self.keys = array("Q", bytes(16 * self.buckets))
+        self.values = array("Q", bytes(16 * self.buckets))
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    # Marks the start of a new search, so that entries left from earlier
+    # searches are replaced before those of the current one.
+    def new_search(self):
+        self.age = (self.age + 1) & 0xFF
+
+    # Returns the TableEntry stored for 'key', or None.
+    def probe(self, key):
+        self.probes += 1
+        index = 2 * (key % self.buckets)
+        for slot in (index, index + 1):
+            value = self.values[slot]
+            if value and self.keys[slot] == key:
+                self.hits += 1
+                return TableEntry(
+                    value >> _DEPTH_SHIFT & 0xFF,
+                    value >> _BOUND_SHIFT & 3,
+                    (value >> _SCORE_SHIFT) - _SCORE_OFFSET,
+                    value & 0xFFFF,
+                )
+        return None
+
+    # Stores a search result for 'key'. The first slot of the bucket keeps
+    # whichever entry was searched deepest in the current search, and an
+    # entry pushed out of it moves to the second slot, which is always
+    # overwritten. A result without a move keeps any move already stored
+    # for the same position.
+    def store(self, key, depth, bound, score, move=0):
+        self.stores += 1
+        index = 2 * (key % self.buckets)
+        keys = self.keys
+        values = self.values
+        first = values[index]
+        if (
+            not first
+            or keys[index] == key
+            or first >> _AGE_SHIFT & 0xFF != self.age
+            or depth >= first >> _DEPTH_SHIFT & 0xFF
+        ):
+            slot = index
+            if first and keys[index] != key:
+                keys[index + 1] = keys[index]
+                values[index + 1] = first
+        else:
+            slot = index + 1
+        if not move and keys[slot] == key and values[slot]:
+            move = values[slot] & 0xFFFF
+        values[slot] = (
+            move
+            | min(max(depth, 0), 0xFF) << _DEPTH_SHIFT
+            | bound << _BOUND_SHIFT
+            | self.age << _AGE_SHIFT
+            | (score + _SCORE_OFFSET) << _SCORE_SHIFT
+        )
+        keys[slot] = key
+
+    # The share of probes that found an entry, from 0.0 to 1.0.
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    # How full the table is, in parts per thousand, from a sample of the
+    # first thousand slots.
+    def usage(self):
+        sample = min(1000, len(self.values))
+        values = self.values
+        used = sum(
+            1
+            for slot in range(sample)
+            if values[slot] and values[slot] >> _AGE_SHIFT & 0xFF == self.age
+        )
+        return used * 1000 // sample